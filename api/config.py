@@ -1,10 +1,58 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import EmailStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
-class BaseConfig(BaseSettings, extra="allow"):
+class DBConfig(BaseSettings, extra="allow"):
+    """データベース接続の設定。エンジン生成時に読み込まれる。"""
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # 接続が空くのを待つ秒数
+    DB_POOL_TIMEOUT: float = 30
+    # MySQLの wait_timeout より短い秒数で接続を張り直す
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_PRE_PING: bool = True
+    # 読み込み用レプリカのホスト(host[:port] をカンマ区切り)
+    DB_REPLICA_HOSTS: str = ""
+    # 書き込み後、そのユーザーの読み込みをプライマリに送る秒数
+    DB_READ_YOUR_WRITES_SECONDS: float = 5
+    # リクエストごとのSQLの件数と実行時間を Server-Timing ヘッダーとログに出力する
+    DB_QUERY_STATS: bool = False
+    # 実行時間がこのミリ秒を超えたSQLを実行計画とともに記録する(未設定の場合は無効)
+    DB_SLOW_QUERY_MS: Optional[float] = None
+    DB_SLOW_QUERY_LOG_SIZE: int = 100
+    # SQLを発行する遅延読み込み(N+1)を検出する。warn: ログ出力、raise: 例外送出
+    DB_LAZY_LOAD_DETECTION: Literal["off", "warn", "raise"] = "off"
+    # 求人・イベント一覧の結果をキャッシュする秒数(未設定の場合は無効)
+    LISTING_CACHE_TTL: Optional[float] = None
+    LISTING_CACHE_SIZE: int = 1000
+    # 開始日時を過ぎた next_start_time を進める間隔の秒数。
+    # 実行しない場合、最初の日時を過ぎた求人・イベントが近日順の一覧から外れる
+    NEXT_START_SWEEP_SECONDS: Optional[float] = 60
+    # 閲覧の記録をバッファに集約し、まとめて書き込む間隔の秒数(未設定の場合は閲覧ごとに書き込む)
+    VIEW_FLUSH_SECONDS: Optional[float] = None
+    # 閲覧数を加算するシャードの数(未設定の場合は求人・イベントの行に直接加算する)
+    VIEW_COUNTER_SHARDS: Optional[int] = None
+    # シャードの閲覧数を求人・イベントの閲覧数に集約する間隔の秒数
+    VIEW_SHARD_COMPACT_SECONDS: float = 60
+    # 閲覧を記録し、日ごとの集計に反映する間隔の秒数(未設定の場合は記録しない)
+    IMPRESSION_ROLLUP_SECONDS: Optional[float] = None
+    # 閲覧したユーザーの HyperLogLog を書き込む間隔の秒数(未設定の場合は推定しない)
+    VIEWER_SKETCH_SECONDS: Optional[float] = None
+    # 認証したユーザーをトークンのユーザー名ごとにキャッシュする秒数(未設定の場合は無効)
+    PRINCIPAL_CACHE_TTL: Optional[float] = None
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    # パスワードのハッシュ化・検証を行うワーカーの数と、実行を待てる件数(超えた分は 503 を返す)
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE: int = 16
+    # ワーカーをスレッドではなくプロセスにする
+    PASSWORD_HASH_PROCESSES: bool = False
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+
+
+class BaseConfig(DBConfig, extra="allow"):
     SECRET_KEY: str
     IS_PRODUCT: bool = False
     MAIL_PASSWORD: Optional[str] = None
@@ -0,0 +1,149 @@
+import datetime
+from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm.session import Session
+
+from api import models
+from api.db import viewer_sketches
+from api.utils import get_jst_now
+from api.utils.hll import HyperLogLog
+
+# 名前空間ごとの(投稿, 閲覧数のシャード, 閲覧したユーザーの HyperLogLog, 投稿 id の列名)
+DASHBOARD_MODELS = {
+    "jobs": (models.Job, models.JobViewShard, models.JobViewSketch, "job_id"),
+    "events": (
+        models.Event,
+        models.EventViewShard,
+        models.EventViewSketch,
+        "event_id",
+    ),
+}
+# 閲覧したユーザー数を推定する既定の日数。読み込む HyperLogLog を投稿の数 × 日数に抑える
+DASHBOARD_DAYS = 30
+
+
+def average(review_sum: int, review_count: int):
+    if not review_count:
+        return None
+    return round(review_sum / review_count, 1)
+
+
+def get_posting_stats(
+    db: Session,
+    namespace: str,
+    user_id: int,
+    since: datetime.date,
+    applications: Optional[dict] = None,
+) -> dict:
+    """
+    ユーザーの投稿ごとと全体の集計を、投稿の数によらない回数のクエリで取得する。
+    閲覧したユーザー数は since 以降のものを推定する。
+    applications には投稿 id ごとの応募のステータスごとの件数を渡す
+    """
+    posting, shard_model, sketch_model, owner_id_name = DASHBOARD_MODELS[namespace]
+    shard_owner = getattr(shard_model, owner_id_name)
+    shard_totals = (
+        select(shard_owner.label("id"), func.sum(shard_model.count).label("views"))
+        .join(posting, posting.id == shard_owner)
+        .where(posting.user_id == user_id)
+        .group_by(shard_owner)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            posting.id,
+            posting.name,
+            posting.status,
+            posting.view_count + func.coalesce(shard_totals.c.views, 0),
+            posting.bookmark_count,
+            posting.review_count,
+            posting.review_sum,
+        )
+        .outerjoin(shard_totals, shard_totals.c.id == posting.id)
+        .where(posting.user_id == user_id)
+        .order_by(posting.id)
+    ).all()
+
+    sketch_owner = getattr(sketch_model, owner_id_name)
+    sketches = {}
+    total_sketch = None
+    # HyperLogLog を記録していない場合は、閲覧したユーザー数を None とする
+    sketch_rows = (
+        db.execute(
+            select(sketch_owner, sketch_model.registers)
+            .join(posting, posting.id == sketch_owner)
+            .where(posting.user_id == user_id, sketch_model.day >= since)
+        )
+        if viewer_sketches.enabled
+        else []
+    )
+    for owner_id, registers in sketch_rows:
+        sketch = HyperLogLog.from_bytes(registers)
+        if owner_id in sketches:
+            sketches[owner_id].merge(sketch)
+        else:
+            sketches[owner_id] = HyperLogLog.from_bytes(registers)
+        if total_sketch is None:
+            total_sketch = sketch
+        else:
+            total_sketch.merge(sketch)
+
+    applications = applications or {}
+    postings = []
+    total_applications = defaultdict(int)
+    for id, name, status, views, bookmarks, reviews, review_sum in rows:
+        for application_status, count in applications.get(id, {}).items():
+            total_applications[application_status] += count
+        postings.append(
+            {
+                "id": id,
+                "name": name,
+                "status": status,
+                "views": views,
+                "unique_viewers": sketches[id].count() if id in sketches else None,
+                "bookmarks": bookmarks,
+                "reviews": reviews,
+                "average_review_point": average(review_sum, reviews),
+                "applications": applications.get(id, {}),
+            }
+        )
+    return {
+        "postings": postings,
+        "total": {
+            "views": sum(row[3] for row in rows),
+            "unique_viewers": total_sketch.count() if total_sketch else None,
+            "bookmarks": sum(row[4] for row in rows),
+            "reviews": sum(row[5] for row in rows),
+            "average_review_point": average(
+                sum(row[6] for row in rows), sum(row[5] for row in rows)
+            ),
+            "applications": dict(total_applications),
+        },
+    }
+
+
+def get_application_counts(db: Session, user_id: int) -> dict:
+    """ユーザーの求人ごとの、応募のステータスごとの件数"""
+    counts = defaultdict(dict)
+    for job_id, status, count in db.execute(
+        select(models.Application.job_id, models.Application.status, func.count())
+        .join(models.Job, models.Job.id == models.Application.job_id)
+        .where(models.Job.user_id == user_id)
+        .group_by(models.Application.job_id, models.Application.status)
+    ):
+        counts[job_id][status] = count
+    return counts
+
+
+def get_company_dashboard(
+    db: Session, user_id: int, days: int = DASHBOARD_DAYS
+) -> dict:
+    since = get_jst_now().date() - datetime.timedelta(days=days - 1)
+    return {
+        "jobs": get_posting_stats(
+            db, "jobs", user_id, since, get_application_counts(db, user_id)
+        ),
+        "events": get_posting_stats(db, "events", user_id, since),
+    }
@@ -1,13 +1,180 @@
+import calendar
 import datetime
-from typing import Literal
+from typing import Literal, Optional
 
 from fastapi import HTTPException
+from sqlalchemy import (
+    DateTime,
+    and_,
+    distinct,
+    exists,
+    literal,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql import desc, func, or_
+from sqlalchemy.sql import func, or_
 
+import api.cruds.search as search_crud
+import api.cruds.stats as stats_crud
 import api.cruds.tag as tag_crud
+import api.cruds.watch as watch_crud
 from api import models, schemas
-from api.utils import get_jst_now
+from api.db import db_config, view_buffer, viewer_sketches
+from api.utils import MAX_SLOT_DURATION, get_jst_now
+from api.utils.cursor import SortKey, encode_cursor, order_by_sort_key, seek
+from api.utils.hll import HyperLogLog
+from api.utils.search import normalize
+
+
+def event_list_options() -> tuple:
+    """一覧表示(EventListView)で参照するリレーションのローダーオプション"""
+    return (
+        selectinload(models.Event.event_times),
+        selectinload(models.Event.tags),
+    )
+
+
+def event_detail_options() -> tuple:
+    """詳細表示(Event)で参照するリレーションのローダーオプション"""
+    return event_list_options() + (
+        selectinload(models.Event.reviews)
+        .selectinload(models.EventReview.user)
+        .selectinload(models.User.company),
+        selectinload(models.Event.author).selectinload(models.User.company),
+        selectinload(models.Event.purchase).selectinload(models.Purchase.plan),
+    )
+
+
+def event_counter_update(event_id: int, **deltas: int):
+    """
+    お気に入り・閲覧・レビューのカウンター列を増減する UPDATE 文を作成する。
+    同時に書き込まれても加算が失われないよう、SQL 側で加算する。
+    """
+    values = {
+        name: getattr(models.Event, name) + delta for name, delta in deltas.items()
+    }
+    # カウンターの更新はイベント自体の更新ではないため、updated_at は変更しない
+    values["updated_at"] = models.Event.updated_at
+    return update(models.Event).where(models.Event.id == event_id).values(values)
+
+
+def add_event_views(db: Session, event_id: int, count: int = 1) -> None:
+    """閲覧数を加算する。シャードが有効な場合はランダムなシャードに加算する"""
+    if db_config.VIEW_COUNTER_SHARDS:
+        result = db.execute(
+            watch_crud.shard_increment(
+                models.EventViewShard,
+                "event_id",
+                event_id,
+                count,
+                db_config.VIEW_COUNTER_SHARDS,
+            )
+        )
+        if result.rowcount:
+            return
+    # シャードの行がまだない場合は直接加算する
+    db.execute(event_counter_update(event_id, view_count=count))
+
+
+async def add_event_views_async(
+    db: AsyncSession, event_id: int, count: int = 1
+) -> None:
+    if db_config.VIEW_COUNTER_SHARDS:
+        result = await db.execute(
+            watch_crud.shard_increment(
+                models.EventViewShard,
+                "event_id",
+                event_id,
+                count,
+                db_config.VIEW_COUNTER_SHARDS,
+            )
+        )
+        if result.rowcount:
+            return
+    await db.execute(event_counter_update(event_id, view_count=count))
+
+
+def compact_event_view_shards(db: Session) -> int:
+    """
+    シャードの閲覧数を Event.view_count に集約する。定期的に実行する。
+    シャードの行がないイベントには作成する
+    """
+    watch_crud.create_shards(
+        db,
+        models.EventViewShard,
+        models.Event,
+        "event_id",
+        db_config.VIEW_COUNTER_SHARDS,
+    )
+    totals = watch_crud.compact_shards(db, models.EventViewShard, "event_id")
+    for event_id, count in totals.items():
+        db.execute(event_counter_update(event_id, view_count=count))
+    db.commit()
+    return len(totals)
+
+
+def get_event_view_count(db: Session, event_id: int) -> int:
+    """集約前のシャードを含めた閲覧数"""
+    return db.scalar(
+        select(
+            models.Event.view_count
+            + watch_crud.shard_total(models.EventViewShard, "event_id", event_id)
+        ).where(models.Event.id == event_id)
+    )
+
+
+def next_start_time_update(*conditions):
+    """next_start_time を、現在以降で最も早い開催日時に更新する UPDATE 文を作成する"""
+    next_start_time = (
+        select(func.min(models.EventTime.start_time))
+        .where(
+            models.EventTime.event_id == models.Event.id,
+            models.EventTime.start_time >= get_jst_now(),
+        )
+        .scalar_subquery()
+    )
+    return (
+        update(models.Event)
+        .where(*conditions)
+        .values(next_start_time=next_start_time, updated_at=models.Event.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def sweep_next_start_times(db: Session) -> int:
+    """開始日時を過ぎた next_start_time を次の日時に進める。定期的に実行する"""
+    result = db.execute(
+        next_start_time_update(models.Event.next_start_time < get_jst_now())
+    )
+    db.commit()
+    return result.rowcount
+
+
+def index_event(db: Session, event: models.Event, tag_names: list[str]) -> None:
+    """イベントのキーワード検索用の索引を更新する。名前とタグに一致するほど上位になる"""
+    search_crud.replace_grams(
+        db,
+        models.EventSearchGram,
+        "event_id",
+        event.id,
+        [
+            (event.name, 10),
+            *((name, 5) for name in tag_names),
+            (event.prefecture, 3),
+            (event.city, 3),
+            (event.address, 1),
+            (event.description, 1),
+        ],
+    )
+
+
+def reindex_events(db: Session) -> int:
+    """既存のイベントすべての検索用の索引を作り直す"""
+    return search_crud.reindex(db, models.Event, index_event)
 
 
 def create_event(
@@ -16,6 +183,17 @@ def create_event(
     tmp = event_create.model_dump(exclude={"tags", "event_times"})
     event = models.Event(**tmp, user_id=user_id)
     db.add(event)
+    db.flush()
+    if db_config.VIEW_COUNTER_SHARDS:
+        watch_crud.create_shards(
+            db,
+            models.EventViewShard,
+            models.Event,
+            "event_id",
+            db_config.VIEW_COUNTER_SHARDS,
+            models.Event.id == event.id,
+        )
+    index_event(db, event, [tag.name for tag in event_create.tags or []])
     db.commit()
     db.refresh(event)
     return event
@@ -33,7 +211,11 @@ def create_event_times(
         if event_time is None:
             event_time = models.EventTime(**tmp)
         results.append(event_time)
+    # 既存の日時を付け替えた場合は、元のイベントの next_start_time も再計算する
+    event_ids = {event.id} | {t.event_id for t in results if t.event_id is not None}
     event.event_times = results
+    db.flush()
+    db.execute(next_start_time_update(models.Event.id.in_(event_ids)))
     db.commit()
     db.refresh(event)
     return event
@@ -49,6 +231,7 @@ def update_event(
     tmp = event_update.model_dump(exclude={"tags", "event_times"}, exclude_unset=True)
     for key, value in tmp.items():
         setattr(event, key, value)
+    index_event(db, event, [tag.name for tag in tags or []])
     db.commit()
     db.refresh(event)
     return event
@@ -61,28 +244,95 @@ def get_event(db: Session, id: int) -> models.Event:
     return event
 
 
-def watch_event(db: Session, event_id: int, user_id: int) -> models.Event:
-    event = get_event(db, event_id)
-    watched_users = (
-        db.query(models.EventWatched)
-        .filter(
+async def get_event_async(db: AsyncSession, id: int) -> models.Event:
+    event = await db.scalar(
+        select(models.Event)
+        .options(*event_detail_options())
+        .filter(models.Event.id == id)
+    )
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event Not Found")
+    return event
+
+
+async def record_watch_async(db: AsyncSession, event_id: int, user_id: int) -> None:
+    """閲覧履歴と閲覧数を記録する"""
+    if viewer_sketches.enabled:
+        viewer_sketches.add(("events", event_id, get_jst_now().date()), user_id)
+    if view_buffer.enabled:
+        view_buffer.add(("events", user_id, event_id), get_jst_now())
+        return
+    watched_users = await db.scalar(
+        select(models.EventWatched).filter(
             models.EventWatched.user_id == user_id,
             models.EventWatched.event_id == event_id,
         )
-        .first()
     )
     if watched_users is None:
         watched_users = models.EventWatched(user_id=user_id, event_id=event_id)
         db.add(watched_users)
     else:
         watched_users.count += 1
-    db.commit()
-    db.refresh(event)
-    return event
+    await add_event_views_async(db, event_id)
+    if db_config.IMPRESSION_ROLLUP_SECONDS:
+        db.add(models.EventViewLog(event_id=event_id, user_id=user_id))
+    await db.commit()
+
+
+def flush_event_views(
+    db: Session, views: dict[tuple[int, int], tuple[int, datetime.datetime]]
+) -> None:
+    """バッファに集約した閲覧を書き込む。コミットは呼び出し元で行う"""
+    counts = watch_crud.upsert_views(
+        db,
+        models.EventWatched,
+        models.Event,
+        "event_id",
+        views,
+        log_model=models.EventViewLog if db_config.IMPRESSION_ROLLUP_SECONDS else None,
+    )
+    for event_id, count in counts.items():
+        add_event_views(db, event_id, count)
+
+
+def merge_event_view_sketches(
+    db: Session, sketches: dict[tuple[int, datetime.date], HyperLogLog]
+) -> None:
+    """バッファの HyperLogLog を書き込む。コミットは呼び出し元で行う"""
+    watch_crud.merge_sketches(
+        db, models.EventViewSketch, models.Event, "event_id", sketches
+    )
+
+
+async def is_bookmarked_async(db: AsyncSession, event_id: int, user_id: int) -> bool:
+    return await db.scalar(
+        select(
+            exists().where(
+                models.EventBookmark.user_id == user_id,
+                models.EventBookmark.event_id == event_id,
+            )
+        )
+    )
+
+
+async def bookmarked_event_ids_async(
+    db: AsyncSession, user_id: int, event_ids: list[int]
+) -> set[int]:
+    """event_ids のうち、ユーザーがお気に入り登録しているものを返す"""
+    if not event_ids:
+        return set()
+    result = await db.scalars(
+        select(models.EventBookmark.event_id).where(
+            models.EventBookmark.user_id == user_id,
+            models.EventBookmark.event_id.in_(event_ids),
+        )
+    )
+    return set(result)
 
 
 def delete_event(db: Session, id: int) -> bool:
     event = db.query(models.Event).filter(models.Event.id == id).first()
+    search_crud.delete_grams(db, models.EventSearchGram, "event_id", id)
     db.delete(event)
     db.commit()
     return True
@@ -92,7 +342,11 @@ def get_event_by_tag(db: Session, tag_name: str) -> list[models.Event]:
     tag = tag_crud.get_tag_by_name(db, tag_name)
     if tag is None:
         raise HTTPException(status_code=404, detail="Tag Not Found")
-    return tag.events
+    return db.scalars(
+        select(models.Event)
+        .options(*event_list_options())
+        .filter(models.Event.tags.any(models.Tag.id == tag.id))
+    ).all()
 
 
 # 開催時期が3日以内のイベントを取得
@@ -101,43 +355,112 @@ def get_recent_events(db: Session) -> list[models.Event]:
     start_time = now + datetime.timedelta(days=3)
     events = (
         db.query(models.Event)
-        .join(models.EventTime)
+        .options(*event_list_options())
         .filter(
-            models.EventTime.start_time >= now,
-            models.EventTime.start_time <= start_time,
+            models.Event.next_start_time >= now,
+            models.Event.next_start_time <= start_time,
             models.Event.status == "1",
         )
+        .order_by(models.Event.next_start_time)
         .all()
     )
     return events
 
 
-def get_events(
+def overlapping_event_ids(
+    time_from: Optional[datetime.datetime], time_to: Optional[datetime.datetime]
+):
+    """期間と重なる日時があるイベントの id を返す副問い合わせ。日時の複合インデックスを範囲検索する"""
+    conditions = []
+    if time_to is not None:
+        conditions.append(models.EventTime.start_time < time_to)
+    if time_from is not None:
+        # 日時の長さには上限があるため、開始日時の下限も指定してインデックスの範囲を狭める
+        conditions.append(models.EventTime.start_time > time_from - MAX_SLOT_DURATION)
+        conditions.append(models.EventTime.end_time > time_from)
+    return select(models.EventTime.event_id).where(*conditions)
+
+
+def get_event_calendar(
     db: Session,
+    year: int,
+    month: int,
+    status: Literal["all", "active", "inactive", "draft"] = "all",
+) -> list[dict]:
+    """
+    月の日ごとに、その日と重なる日時があるイベントの数を 1 回の集計で取得する。
+    """
+    first = datetime.datetime(year, month, 1)
+    days = [
+        first + datetime.timedelta(days=i)
+        for i in range(calendar.monthrange(year, month)[1])
+    ]
+    day_table = union_all(
+        *(
+            select(
+                literal(i).label("day"),
+                literal(day, DateTime).label("day_start"),
+                literal(day + datetime.timedelta(days=1), DateTime).label("day_end"),
+            )
+            for i, day in enumerate(days)
+        )
+    ).subquery()
+    stmt = (
+        select(day_table.c.day, func.count(distinct(models.EventTime.event_id)))
+        .select_from(day_table)
+        .join(
+            models.EventTime,
+            and_(
+                models.EventTime.start_time < day_table.c.day_end,
+                models.EventTime.end_time > day_table.c.day_start,
+            ),
+        )
+        .where(
+            models.EventTime.start_time < days[-1] + datetime.timedelta(days=1),
+            models.EventTime.start_time > first - MAX_SLOT_DURATION,
+            models.EventTime.end_time > first,
+        )
+        .group_by(day_table.c.day)
+    )
+    if status != "all":
+        stmt = stmt.join(
+            models.Event, models.Event.id == models.EventTime.event_id
+        ).filter(models.Event.status == status)
+    counts = dict(db.execute(stmt).all())
+    return [
+        {"day": day.date(), "count": counts.get(i, 0)} for i, day in enumerate(days)
+    ]
+
+
+def get_events_statement(
     status: Literal["all", "active", "inactive", "draft"] = "all",
     keyword: str = "",
-    sort: Literal["review", "favorite", "recent", "id", "pv", "last_watched"] = "id",
+    sort: Literal[
+        "review", "favorite", "recent", "id", "pv", "last_watched", "relevance"
+    ] = "id",
     order: str = "desc",
-    offset: int = 0,
-    limit: int = 100,
     tag_name="",
     user_id: int = None,
     target: Literal["favorite", "history", "posted", "apply"] = None,
+    cursor: Optional[str] = None,
+    time_from: Optional[datetime.datetime] = None,
+    time_to: Optional[datetime.datetime] = None,
 ):
-    stmt = db.query(models.Event)
+    """
+    一覧取得の絞り込みと並び替えを行う SELECT 文を組み立てる。
+    time_from, time_to を指定した場合は、その期間と重なる日時があるイベントに絞り込む。
+    並び替えの値を 2 列目に含めるため、結果の末尾の行から次のページのカーソルを作成できる。
+    """
+    stmt = select(models.Event)
     if status == "posted":
         stmt = stmt.filter(
             or_(models.Event.status == "active", models.Event.status == "inactive")
         )
     elif status != "all":
         stmt = stmt.filter(models.Event.status == status)
-    if keyword != "":
-        stmt = stmt.filter(
-            or_(
-                models.Event.name.contains(keyword),
-                models.Event.tags.any(models.Tag.name.contains(keyword)),
-            )
-        )
+    scores = search_crud.search_scores(models.EventSearchGram, "event_id", keyword)
+    if scores is not None:
+        stmt = stmt.join(scores, scores.c.id == models.Event.id)
     if user_id:
         if target == "favorite":
             stmt = stmt.join(models.EventBookmark).filter(
@@ -149,76 +472,98 @@ def get_events(
             )
         elif target == "posted":
             stmt = stmt.filter(models.Event.user_id == user_id)
+    if time_from or time_to:
+        stmt = stmt.filter(
+            models.Event.id.in_(overlapping_event_ids(time_from, time_to))
+        )
     if tag_name:
-        stmt = stmt.filter(models.Event.tags.any(models.Tag.name == tag_name))
+        stmt = stmt.filter(
+            models.Event.tags.any(models.Tag.name_key == normalize(tag_name))
+        )
     if sort == "id":
-        stmt = get_events_by_id(stmt)
+        stmt, key = get_events_by_id(stmt)
     elif sort == "review":
-        stmt = get_events_by_review(stmt)
+        stmt, key = get_events_by_review(stmt)
     elif sort == "favorite":
-        stmt = get_events_by_bookmark(stmt, target)
+        stmt, key = get_events_by_bookmark(stmt, target)
     elif sort == "pv":
-        stmt = get_events_by_pv(stmt, target)
+        stmt, key = get_events_by_pv(stmt, target)
     elif sort == "last_watched":
-        stmt = get_events_by_last_watched(stmt, target)
+        stmt, key = get_events_by_last_watched(stmt, target)
+    elif sort == "relevance":
+        stmt, key = get_events_by_relevance(stmt, scores)
     else:
-        stmt = get_events_by_recent(stmt)
-    return stmt.offset(offset).limit(limit).all()
+        stmt, key = get_events_by_recent(stmt)
+    stmt = seek(stmt, key, models.Event.id, sort, cursor)
+    return order_by_sort_key(stmt, key, models.Event.id).add_columns(key.expr)
+
+
+def get_events(
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    **kwargs,
+) -> list[models.Event]:
+    stmt = get_events_statement(**kwargs).options(*event_list_options())
+    return db.scalars(stmt.offset(offset).limit(limit)).all()
+
+
+async def get_events_async(
+    db: AsyncSession,
+    offset: int = 0,
+    limit: int = 100,
+    **kwargs,
+) -> tuple[list[models.Event], Optional[str]]:
+    """
+    一覧と次のページのカーソルを返す。
+    取得件数が limit に満たない場合は最後のページとして、カーソルは None になる。
+    """
+    stmt = get_events_statement(**kwargs).options(*event_list_options())
+    rows = (await db.execute(stmt.offset(offset).limit(limit))).all()
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last, value = rows[-1]
+        next_cursor = encode_cursor(kwargs.get("sort", "id"), value, last.id)
+    return [row[0] for row in rows], next_cursor
 
 
 # Reviewの評価平均順にイベントを取得
 def get_events_by_review(query):
-    return (
-        query.outerjoin(models.EventReview)
-        .order_by(func.avg(models.EventReview.review_point).desc())
-        .group_by(models.Event.id)
-    )
+    return query, SortKey(models.Event.review_average)
 
 
 def get_events_by_last_watched(query, target):
-    if target == "history":
-        return query.order_by(models.EventWatched.updated_at.desc())
-    return query.join(models.EventWatched).order_by(
-        desc(models.EventWatched.updated_at)
-    )
+    if target != "history":
+        query = query.join(models.EventWatched)
+    return query, SortKey(models.EventWatched.updated_at)
 
 
 def get_events_by_pv(query, target):
-    if target == "history":
-        return query.order_by(func.count(models.EventWatched.user_id).desc()).group_by(
-            models.Event.id
-        )
-    return (
-        query.outerjoin(models.EventWatched)
-        .order_by(func.sum(models.EventWatched.count).desc())
-        .group_by(models.Event.id)
-    )
+    return query, SortKey(models.Event.view_count)
+
+
+def get_events_by_relevance(query, scores):
+    # キーワードが指定されていない場合は id 順とする
+    if scores is None:
+        return get_events_by_id(query)
+    return query, SortKey(scores.c.score)
 
 
 def get_events_by_id(query):
-    return query.order_by(models.Event.id.desc())
+    return query, SortKey(models.Event.id)
 
 
 def get_events_by_recent(query):
     now = get_jst_now()
     # 現在日時と開催日時の差が小さい順にイベントを取得、開催日時が過ぎているものは除外
     return (
-        query.join(models.EventTime)
-        .filter(models.EventTime.start_time >= now)
-        .order_by(models.EventTime.start_time)
+        query.filter(models.Event.next_start_time >= now),
+        SortKey(models.Event.next_start_time, descending=False),
     )
 
 
 def get_events_by_bookmark(query, target):
-    if target == "favorite":
-        return query.order_by(func.count(models.EventBookmark.user_id).desc()).group_by(
-            models.Event.id
-        )
-    return (
-        query.outerjoin(models.EventBookmark)
-        .order_by(func.count(models.EventBookmark.user_id).desc())
-        .group_by(models.Event.id)
-    )
+    return query, SortKey(models.Event.bookmark_count)
 
 
 def create_review(
@@ -228,6 +573,11 @@ def create_review(
         **review.model_dump(), user_id=user_id, event_id=event_id
     )
     db.add(event_review)
+    db.execute(
+        event_counter_update(
+            event_id, review_count=1, review_sum=event_review.review_point
+        )
+    )
     db.commit()
     db.refresh(event_review)
     return event_review
@@ -248,9 +598,16 @@ def update_review(
     db: Session, event_id: int, user_id: int, review: schemas.EventReviewCreate
 ):
     event_review = get_review(db, event_id, user_id)
+    old_point = event_review.review_point
     tmp = review.model_dump(exclude_unset=True)
     for key, value in tmp.items():
         setattr(event_review, key, value)
+    if event_review.review_point != old_point:
+        db.execute(
+            event_counter_update(
+                event_id, review_sum=event_review.review_point - old_point
+            )
+        )
     db.commit()
     db.refresh(event_review)
     return event_review
@@ -259,6 +616,11 @@ def update_review(
 def delete_review(db: Session, event_id: int, user_id: int):
     event_review = get_review(db, event_id, user_id)
     db.delete(event_review)
+    db.execute(
+        event_counter_update(
+            event_id, review_count=-1, review_sum=-event_review.review_point
+        )
+    )
     db.commit()
     return True
 
@@ -274,11 +636,13 @@ def toggle_bookmark_event(db: Session, event_id: int, user_id: int):
     )
     if bookmark:
         db.delete(bookmark)
+        db.execute(event_counter_update(event_id, bookmark_count=-1))
         db.commit()
         return False
     else:
         bookmark = models.EventBookmark(user_id=user_id, event_id=event_id)
         db.add(bookmark)
+        db.execute(event_counter_update(event_id, bookmark_count=1))
         db.commit()
         db.refresh(bookmark)
         return True
@@ -288,61 +652,47 @@ def get_event_impressions(
     db: Session,
     event_id: int,
 ):
-    def get_age_range(
-        age: int,
-    ) -> Literal["under_20", "20-24", "25-29", "30-34", "35-39", "over_40"]:
-        if age < 20:
-            return "under_20"
-        elif age < 25:
-            return "20-24"
-        elif age < 30:
-            return "25-29"
-        elif age < 35:
-            return "30-34"
-        elif age < 40:
-            return "35-39"
-        else:
-            return "over_40"
-
     event = get_event(db, event_id)
-    favorite_user_count = len(event.bookmark_users)
-    pv = len(event.watched_user_link)
-    review_count = len(event.reviews)
-
-    age = {
-        "o": {
-            "under_20": 0,
-            "20-24": 0,
-            "25-29": 0,
-            "30-34": 0,
-            "35-39": 0,
-            "over_40": 0,
-        },
-        "m": {
-            "under_20": 0,
-            "20-24": 0,
-            "25-29": 0,
-            "30-34": 0,
-            "35-39": 0,
-            "over_40": 0,
-        },
-        "f": {
-            "under_20": 0,
-            "20-24": 0,
-            "25-29": 0,
-            "30-34": 0,
-            "35-39": 0,
-            "over_40": 0,
-        },
-    }
-
-    for link in event.watched_user_link:
-        user_age = get_jst_now().year - link.user.birthday.year
-        age[link.user.sex][get_age_range(user_age)] += 1
-
+    pv, sex = watch_crud.watcher_histogram(
+        db, models.EventWatched, "event_id", event_id
+    )
     return {
-        "favorite_user_count": favorite_user_count,
+        "favorite_user_count": event.bookmark_count,
         "pv": pv,
-        "review_count": review_count,
-        "sex": age,
+        "review_count": event.review_count,
+        "sex": sex,
+        # HyperLogLog を記録していない場合は、閲覧したユーザー数を返さない
+        "unique_viewers": (
+            watch_crud.estimate_viewers(db, models.EventViewSketch, "event_id", [event_id])
+            if viewer_sketches.enabled
+            else None
+        ),
     }
+
+
+# 日ごとの集計に含める、作成日時で数える行のモデル
+EVENT_STAT_SOURCES = {"bookmarks": models.EventBookmark}
+
+
+def rollup_event_daily_stats(db: Session) -> int:
+    """閲覧の記録を日ごとの集計に反映する。定期的に実行する"""
+    count = stats_crud.rollup_daily_stats(
+        db, models.EventDailyStat, models.EventViewLog, "event_id", EVENT_STAT_SOURCES
+    )
+    db.commit()
+    return count
+
+
+def get_event_daily_impressions(
+    db: Session, event_id: int, date_from: datetime.date, date_to: datetime.date
+) -> list[dict]:
+    get_event(db, event_id)
+    return stats_crud.get_daily_stats(
+        db,
+        models.EventDailyStat,
+        "event_id",
+        event_id,
+        ["views", "unique_viewers", *EVENT_STAT_SOURCES],
+        date_from,
+        date_to,
+    )
@@ -1,19 +1,194 @@
+import calendar
 import datetime
-from typing import Literal
+from typing import Literal, Optional
 
 from fastapi import HTTPException
+from sqlalchemy import (
+    DateTime,
+    and_,
+    distinct,
+    exists,
+    literal,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql import desc, func, or_
+from sqlalchemy.sql import func, or_
 
+import api.cruds.search as search_crud
+import api.cruds.stats as stats_crud
 import api.cruds.tag as tag_crud
+import api.cruds.watch as watch_crud
 from api import models, schemas
-from api.utils import get_jst_now
+from api.db import db_config, view_buffer, viewer_sketches
+from api.utils import MAX_SLOT_DURATION, get_jst_now
+from api.utils.cursor import SortKey, encode_cursor, order_by_sort_key, seek
+from api.utils.hll import HyperLogLog
+from api.utils.search import normalize
+
+
+def job_list_options() -> tuple:
+    """一覧表示(JobListView)で参照するリレーションのローダーオプション"""
+    return (
+        selectinload(models.Job.job_times),
+        selectinload(models.Job.tags),
+    )
+
+
+def job_detail_options() -> tuple:
+    """詳細表示(Job)で参照するリレーションのローダーオプション"""
+    return job_list_options() + (
+        selectinload(models.Job.reviews)
+        .selectinload(models.JobReview.user)
+        .selectinload(models.User.company),
+        selectinload(models.Job.author).selectinload(models.User.company),
+        selectinload(models.Job.purchase).selectinload(models.Purchase.plan),
+    )
+
+
+def job_counter_update(job_id: int, **deltas: int):
+    """
+    お気に入り・閲覧・レビューのカウンター列を増減する UPDATE 文を作成する。
+    同時に書き込まれても加算が失われないよう、SQL 側で加算する。
+    """
+    values = {name: getattr(models.Job, name) + delta for name, delta in deltas.items()}
+    # カウンターの更新は求人自体の更新ではないため、updated_at は変更しない
+    values["updated_at"] = models.Job.updated_at
+    return update(models.Job).where(models.Job.id == job_id).values(values)
+
+
+def add_job_views(db: Session, job_id: int, count: int = 1) -> None:
+    """閲覧数を加算する。シャードが有効な場合はランダムなシャードに加算する"""
+    if db_config.VIEW_COUNTER_SHARDS:
+        result = db.execute(
+            watch_crud.shard_increment(
+                models.JobViewShard,
+                "job_id",
+                job_id,
+                count,
+                db_config.VIEW_COUNTER_SHARDS,
+            )
+        )
+        if result.rowcount:
+            return
+    # シャードの行がまだない場合は直接加算する
+    db.execute(job_counter_update(job_id, view_count=count))
+
+
+async def add_job_views_async(db: AsyncSession, job_id: int, count: int = 1) -> None:
+    if db_config.VIEW_COUNTER_SHARDS:
+        result = await db.execute(
+            watch_crud.shard_increment(
+                models.JobViewShard,
+                "job_id",
+                job_id,
+                count,
+                db_config.VIEW_COUNTER_SHARDS,
+            )
+        )
+        if result.rowcount:
+            return
+    await db.execute(job_counter_update(job_id, view_count=count))
+
+
+def compact_job_view_shards(db: Session) -> int:
+    """
+    シャードの閲覧数を Job.view_count に集約する。定期的に実行する。
+    シャードの行がない求人には作成する
+    """
+    watch_crud.create_shards(
+        db,
+        models.JobViewShard,
+        models.Job,
+        "job_id",
+        db_config.VIEW_COUNTER_SHARDS,
+    )
+    totals = watch_crud.compact_shards(db, models.JobViewShard, "job_id")
+    for job_id, count in totals.items():
+        db.execute(job_counter_update(job_id, view_count=count))
+    db.commit()
+    return len(totals)
+
+
+def get_job_view_count(db: Session, job_id: int) -> int:
+    """集約前のシャードを含めた閲覧数"""
+    return db.scalar(
+        select(
+            models.Job.view_count
+            + watch_crud.shard_total(models.JobViewShard, "job_id", job_id)
+        ).where(models.Job.id == job_id)
+    )
+
+
+def next_start_time_update(*conditions):
+    """next_start_time を、現在以降で最も早い仕事日時に更新する UPDATE 文を作成する"""
+    next_start_time = (
+        select(func.min(models.JobTime.start_time))
+        .where(
+            models.JobTime.job_id == models.Job.id,
+            models.JobTime.start_time >= get_jst_now(),
+        )
+        .scalar_subquery()
+    )
+    return (
+        update(models.Job)
+        .where(*conditions)
+        .values(next_start_time=next_start_time, updated_at=models.Job.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def sweep_next_start_times(db: Session) -> int:
+    """開始日時を過ぎた next_start_time を次の日時に進める。定期的に実行する"""
+    result = db.execute(
+        next_start_time_update(models.Job.next_start_time < get_jst_now())
+    )
+    db.commit()
+    return result.rowcount
+
+
+def index_job(db: Session, job: models.Job, tag_names: list[str]) -> None:
+    """求人のキーワード検索用の索引を更新する。名前とタグに一致するほど上位になる"""
+    search_crud.replace_grams(
+        db,
+        models.JobSearchGram,
+        "job_id",
+        job.id,
+        [
+            (job.name, 10),
+            *((name, 5) for name in tag_names),
+            (job.prefecture, 3),
+            (job.city, 3),
+            (job.address, 1),
+            (job.salary, 1),
+            (job.description, 1),
+        ],
+    )
+
+
+def reindex_jobs(db: Session) -> int:
+    """既存の求人すべての検索用の索引を作り直す"""
+    return search_crud.reindex(db, models.Job, index_job)
 
 
 def create_job(db: Session, job_create: schemas.JobCreate, user_id: int) -> models.Job:
     tmp = job_create.model_dump(exclude={"tags", "job_times"})
     job = models.Job(**tmp, user_id=user_id)
     db.add(job)
+    db.flush()
+    if db_config.VIEW_COUNTER_SHARDS:
+        watch_crud.create_shards(
+            db,
+            models.JobViewShard,
+            models.Job,
+            "job_id",
+            db_config.VIEW_COUNTER_SHARDS,
+            models.Job.id == job.id,
+        )
+    index_job(db, job, [tag.name for tag in job_create.tags or []])
     db.commit()
     db.refresh(job)
     return job
@@ -31,7 +206,11 @@ def create_job_times(
         if job_time is None:
             job_time = models.JobTime(**tmp)
         results.append(job_time)
+    # 既存の日時を付け替えた場合は、元の求人の next_start_time も再計算する
+    job_ids = {job.id} | {t.job_id for t in results if t.job_id is not None}
     job.job_times = results
+    db.flush()
+    db.execute(next_start_time_update(models.Job.id.in_(job_ids)))
     db.commit()
     db.refresh(job)
     return job
@@ -45,6 +224,7 @@ def update_job(db: Session, id: int, job_update: schemas.JobCreate) -> models.Jo
     tmp = job_update.model_dump(exclude={"tags", "job_times"}, exclude_unset=True)
     for key, value in tmp.items():
         setattr(job, key, value)
+    index_job(db, job, [tag.name for tag in tags or []])
     db.commit()
     db.refresh(job)
     return job
@@ -57,28 +237,91 @@ def get_job(db: Session, id: int) -> models.Job:
     return job
 
 
-def watch_job(db: Session, job_id: int, user_id: int) -> models.Job:
-    job = get_job(db, job_id)
-    watched_users = (
-        db.query(models.JobWatched)
-        .filter(
+async def get_job_async(db: AsyncSession, id: int) -> models.Job:
+    job = await db.scalar(
+        select(models.Job).options(*job_detail_options()).filter(models.Job.id == id)
+    )
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job Not Found")
+    return job
+
+
+async def record_watch_async(db: AsyncSession, job_id: int, user_id: int) -> None:
+    """閲覧履歴と閲覧数を記録する"""
+    if viewer_sketches.enabled:
+        viewer_sketches.add(("jobs", job_id, get_jst_now().date()), user_id)
+    if view_buffer.enabled:
+        view_buffer.add(("jobs", user_id, job_id), get_jst_now())
+        return
+    watched_users = await db.scalar(
+        select(models.JobWatched).filter(
             models.JobWatched.user_id == user_id,
             models.JobWatched.job_id == job_id,
         )
-        .first()
     )
     if watched_users is None:
         watched_users = models.JobWatched(user_id=user_id, job_id=job_id)
         db.add(watched_users)
     else:
         watched_users.count += 1
-    db.commit()
-    db.refresh(job)
-    return job
+    await add_job_views_async(db, job_id)
+    if db_config.IMPRESSION_ROLLUP_SECONDS:
+        db.add(models.JobViewLog(job_id=job_id, user_id=user_id))
+    await db.commit()
+
+
+def flush_job_views(
+    db: Session, views: dict[tuple[int, int], tuple[int, datetime.datetime]]
+) -> None:
+    """バッファに集約した閲覧を書き込む。コミットは呼び出し元で行う"""
+    counts = watch_crud.upsert_views(
+        db,
+        models.JobWatched,
+        models.Job,
+        "job_id",
+        views,
+        log_model=models.JobViewLog if db_config.IMPRESSION_ROLLUP_SECONDS else None,
+    )
+    for job_id, count in counts.items():
+        add_job_views(db, job_id, count)
+
+
+def merge_job_view_sketches(
+    db: Session, sketches: dict[tuple[int, datetime.date], HyperLogLog]
+) -> None:
+    """バッファの HyperLogLog を書き込む。コミットは呼び出し元で行う"""
+    watch_crud.merge_sketches(db, models.JobViewSketch, models.Job, "job_id", sketches)
+
+
+async def is_bookmarked_async(db: AsyncSession, job_id: int, user_id: int) -> bool:
+    return await db.scalar(
+        select(
+            exists().where(
+                models.JobBookmark.user_id == user_id,
+                models.JobBookmark.job_id == job_id,
+            )
+        )
+    )
+
+
+async def bookmarked_job_ids_async(
+    db: AsyncSession, user_id: int, job_ids: list[int]
+) -> set[int]:
+    """job_ids のうち、ユーザーがお気に入り登録しているものを返す"""
+    if not job_ids:
+        return set()
+    result = await db.scalars(
+        select(models.JobBookmark.job_id).where(
+            models.JobBookmark.user_id == user_id,
+            models.JobBookmark.job_id.in_(job_ids),
+        )
+    )
+    return set(result)
 
 
 def delete_job(db: Session, id: int) -> bool:
     job = db.query(models.Job).filter(models.Job.id == id).first()
+    search_crud.delete_grams(db, models.JobSearchGram, "job_id", id)
     db.delete(job)
     db.commit()
     return True
@@ -150,7 +393,11 @@ def get_job_by_tag(db: Session, tag_name: str) -> list[models.Job]:
     tag = tag_crud.get_tag_by_name(db, tag_name)
     if tag is None:
         raise HTTPException(status_code=404, detail="Tag Not Found")
-    return tag.jobs
+    return db.scalars(
+        select(models.Job)
+        .options(*job_list_options())
+        .filter(models.Job.tags.any(models.Tag.id == tag.id))
+    ).all()
 
 
 # 開催時期が3日以内のイベントを取得
@@ -159,43 +406,112 @@ def get_recent_jobs(db: Session) -> list[models.Job]:
     start_time = now + datetime.timedelta(days=3)
     jobs = (
         db.query(models.Job)
-        .join(models.JobTime)
+        .options(*job_list_options())
         .filter(
-            models.JobTime.start_time >= now,
-            models.JobTime.start_time <= start_time,
+            models.Job.next_start_time >= now,
+            models.Job.next_start_time <= start_time,
             models.Job.status == "1",
         )
+        .order_by(models.Job.next_start_time)
         .all()
     )
     return jobs
 
 
-def get_jobs(
+def overlapping_job_ids(
+    time_from: Optional[datetime.datetime], time_to: Optional[datetime.datetime]
+):
+    """期間と重なる日時がある求人の id を返す副問い合わせ。日時の複合インデックスを範囲検索する"""
+    conditions = []
+    if time_to is not None:
+        conditions.append(models.JobTime.start_time < time_to)
+    if time_from is not None:
+        # 日時の長さには上限があるため、開始日時の下限も指定してインデックスの範囲を狭める
+        conditions.append(models.JobTime.start_time > time_from - MAX_SLOT_DURATION)
+        conditions.append(models.JobTime.end_time > time_from)
+    return select(models.JobTime.job_id).where(*conditions)
+
+
+def get_job_calendar(
     db: Session,
+    year: int,
+    month: int,
+    status: Literal["all", "active", "inactive", "draft"] = "all",
+) -> list[dict]:
+    """
+    月の日ごとに、その日と重なる日時がある求人の数を 1 回の集計で取得する。
+    """
+    first = datetime.datetime(year, month, 1)
+    days = [
+        first + datetime.timedelta(days=i)
+        for i in range(calendar.monthrange(year, month)[1])
+    ]
+    day_table = union_all(
+        *(
+            select(
+                literal(i).label("day"),
+                literal(day, DateTime).label("day_start"),
+                literal(day + datetime.timedelta(days=1), DateTime).label("day_end"),
+            )
+            for i, day in enumerate(days)
+        )
+    ).subquery()
+    stmt = (
+        select(day_table.c.day, func.count(distinct(models.JobTime.job_id)))
+        .select_from(day_table)
+        .join(
+            models.JobTime,
+            and_(
+                models.JobTime.start_time < day_table.c.day_end,
+                models.JobTime.end_time > day_table.c.day_start,
+            ),
+        )
+        .where(
+            models.JobTime.start_time < days[-1] + datetime.timedelta(days=1),
+            models.JobTime.start_time > first - MAX_SLOT_DURATION,
+            models.JobTime.end_time > first,
+        )
+        .group_by(day_table.c.day)
+    )
+    if status != "all":
+        stmt = stmt.join(models.Job, models.Job.id == models.JobTime.job_id).filter(
+            models.Job.status == status
+        )
+    counts = dict(db.execute(stmt).all())
+    return [
+        {"day": day.date(), "count": counts.get(i, 0)} for i, day in enumerate(days)
+    ]
+
+
+def get_jobs_statement(
     status: Literal["all", "active", "inactive", "draft", "posted"] = "all",
     keyword: str = "",
-    sort: Literal["review", "favorite", "recent", "id", "pv", "last_watched"] = "id",
+    sort: Literal[
+        "review", "favorite", "recent", "id", "pv", "last_watched", "relevance"
+    ] = "id",
     order: str = "desc",
-    offset: int = 0,
-    limit: int = 100,
     tag_name="",
     user_id: int = None,
     target: Literal["favorite", "history", "posted"] = None,
+    cursor: Optional[str] = None,
+    time_from: Optional[datetime.datetime] = None,
+    time_to: Optional[datetime.datetime] = None,
 ):
-    stmt = db.query(models.Job)
+    """
+    一覧取得の絞り込みと並び替えを行う SELECT 文を組み立てる。
+    time_from, time_to を指定した場合は、その期間と重なる日時がある求人に絞り込む。
+    並び替えの値を 2 列目に含めるため、結果の末尾の行から次のページのカーソルを作成できる。
+    """
+    stmt = select(models.Job)
     if status == "posted":
         stmt = stmt.filter(
             or_(models.Job.status == "active", models.Job.status == "inactive")
         )
     elif status != "all":
         stmt = stmt.filter(models.Job.status == status)
-    if keyword != "":
-        stmt = stmt.filter(
-            or_(
-                models.Job.name.contains(keyword),
-                models.Job.tags.any(models.Tag.name.contains(keyword)),
-            )
-        )
+    scores = search_crud.search_scores(models.JobSearchGram, "job_id", keyword)
+    if scores is not None:
+        stmt = stmt.join(scores, scores.c.id == models.Job.id)
     if user_id:
         if target == "favorite":
             stmt = stmt.join(models.JobBookmark).filter(
@@ -211,74 +527,96 @@ def get_jobs(
             stmt = stmt.join(models.Application).filter(
                 models.Application.user_id == user_id
             )
+    if time_from or time_to:
+        stmt = stmt.filter(models.Job.id.in_(overlapping_job_ids(time_from, time_to)))
     if tag_name:
-        stmt = stmt.filter(models.Job.tags.any(models.Tag.name == tag_name))
+        stmt = stmt.filter(
+            models.Job.tags.any(models.Tag.name_key == normalize(tag_name))
+        )
     if sort == "id":
-        stmt = get_jobs_by_id(stmt)
+        stmt, key = get_jobs_by_id(stmt)
     elif sort == "review":
-        stmt = get_jobs_by_review(stmt)
+        stmt, key = get_jobs_by_review(stmt)
     elif sort == "favorite":
-        stmt = get_jobs_by_bookmark(stmt, target)
+        stmt, key = get_jobs_by_bookmark(stmt, target)
     elif sort == "pv":
-        stmt = get_jobs_by_pv(stmt, target)
+        stmt, key = get_jobs_by_pv(stmt, target)
     elif sort == "last_watched":
-        stmt = get_jobs_by_last_watched(stmt, target)
+        stmt, key = get_jobs_by_last_watched(stmt, target)
+    elif sort == "relevance":
+        stmt, key = get_jobs_by_relevance(stmt, scores)
     else:
-        stmt = get_jobs_by_recent(stmt)
-    return stmt.offset(offset).limit(limit).all()
+        stmt, key = get_jobs_by_recent(stmt)
+    stmt = seek(stmt, key, models.Job.id, sort, cursor)
+    return order_by_sort_key(stmt, key, models.Job.id).add_columns(key.expr)
+
+
+def get_jobs(
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    **kwargs,
+) -> list[models.Job]:
+    stmt = get_jobs_statement(**kwargs).options(*job_list_options())
+    return db.scalars(stmt.offset(offset).limit(limit)).all()
+
+
+async def get_jobs_async(
+    db: AsyncSession,
+    offset: int = 0,
+    limit: int = 100,
+    **kwargs,
+) -> tuple[list[models.Job], Optional[str]]:
+    """
+    一覧と次のページのカーソルを返す。
+    取得件数が limit に満たない場合は最後のページとして、カーソルは None になる。
+    """
+    stmt = get_jobs_statement(**kwargs).options(*job_list_options())
+    rows = (await db.execute(stmt.offset(offset).limit(limit))).all()
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last, value = rows[-1]
+        next_cursor = encode_cursor(kwargs.get("sort", "id"), value, last.id)
+    return [row[0] for row in rows], next_cursor
 
 
 # Reviewの評価平均順にイベントを取得
 def get_jobs_by_review(query):
-    return (
-        query.outerjoin(models.JobReview)
-        .order_by(func.avg(models.JobReview.review_point).desc())
-        .group_by(models.Job.id)
-    )
+    return query, SortKey(models.Job.review_average)
 
 
 def get_jobs_by_last_watched(query, target):
-    if target == "history":
-        return query.order_by(models.JobWatched.updated_at.desc())
-    return query.join(models.JobWatched).order_by(desc(models.JobWatched.updated_at))
+    if target != "history":
+        query = query.join(models.JobWatched)
+    return query, SortKey(models.JobWatched.updated_at)
 
 
 def get_jobs_by_pv(query, target):
-    if target == "history":
-        return query.order_by(func.count(models.JobWatched.user_id).desc()).group_by(
-            models.Job.id
-        )
-    return (
-        query.outerjoin(models.JobWatched)
-        .order_by(func.sum(models.JobWatched.count).desc())
-        .group_by(models.Job.id)
-    )
+    return query, SortKey(models.Job.view_count)
+
+
+def get_jobs_by_relevance(query, scores):
+    # キーワードが指定されていない場合は id 順とする
+    if scores is None:
+        return get_jobs_by_id(query)
+    return query, SortKey(scores.c.score)
 
 
 def get_jobs_by_id(query):
-    return query.order_by(models.Job.id.desc())
+    return query, SortKey(models.Job.id)
 
 
 def get_jobs_by_recent(query):
     now = get_jst_now()
     # 現在日時と開催日時の差が小さい順にイベントを取得、開催日時が過ぎているものは除外
     return (
-        query.join(models.JobTime)
-        .filter(models.JobTime.start_time >= now)
-        .order_by(models.JobTime.start_time)
+        query.filter(models.Job.next_start_time >= now),
+        SortKey(models.Job.next_start_time, descending=False),
     )
 
 
 def get_jobs_by_bookmark(query, target):
-    if "favorite" == target:
-        return query.order_by(func.count(models.JobBookmark.user_id).desc()).group_by(
-            models.Job.id
-        )
-    return (
-        query.outerjoin(models.JobBookmark)
-        .order_by(func.count(models.JobBookmark.user_id).desc())
-        .group_by(models.Job.id)
-    )
+    return query, SortKey(models.Job.bookmark_count)
 
 
 def create_review(
@@ -286,6 +624,9 @@ def create_review(
 ):
     job_review = models.JobReview(**review.model_dump(), user_id=user_id, job_id=job_id)
     db.add(job_review)
+    db.execute(
+        job_counter_update(job_id, review_count=1, review_sum=job_review.review_point)
+    )
     db.commit()
     db.refresh(job_review)
     return job_review
@@ -306,9 +647,14 @@ def update_review(
     db: Session, job_id: int, user_id: int, review: schemas.JobReviewCreate
 ):
     job_review = get_review(db, job_id, user_id)
+    old_point = job_review.review_point
     tmp = review.model_dump(exclude_unset=True)
     for key, value in tmp.items():
         setattr(job_review, key, value)
+    if job_review.review_point != old_point:
+        db.execute(
+            job_counter_update(job_id, review_sum=job_review.review_point - old_point)
+        )
     db.commit()
     db.refresh(job_review)
     return job_review
@@ -317,6 +663,9 @@ def update_review(
 def delete_review(db: Session, job_id: int, user_id: int):
     job_review = get_review(db, job_id, user_id)
     db.delete(job_review)
+    db.execute(
+        job_counter_update(job_id, review_count=-1, review_sum=-job_review.review_point)
+    )
     db.commit()
     return True
 
@@ -332,11 +681,13 @@ def toggle_bookmark_job(db: Session, job_id: int, user_id: int):
     )
     if bookmark:
         db.delete(bookmark)
+        db.execute(job_counter_update(job_id, bookmark_count=-1))
         db.commit()
         return False
     else:
         bookmark = models.JobBookmark(user_id=user_id, job_id=job_id)
         db.add(bookmark)
+        db.execute(job_counter_update(job_id, bookmark_count=1))
         db.commit()
         db.refresh(bookmark)
         return True
@@ -346,61 +697,45 @@ def get_job_impressions(
     db: Session,
     job_id: int,
 ):
-    def get_age_range(
-        age: int,
-    ) -> Literal["under_20", "20-24", "25-29", "30-34", "35-39", "over_40"]:
-        if age < 20:
-            return "under_20"
-        elif age < 25:
-            return "20-24"
-        elif age < 30:
-            return "25-29"
-        elif age < 35:
-            return "30-34"
-        elif age < 40:
-            return "35-39"
-        else:
-            return "over_40"
-
     job = get_job(db, job_id)
-    favorite_user_count = len(job.bookmark_users)
-    pv = len(job.watched_user_link)
-    review_count = len(job.reviews)
-
-    age = {
-        "o": {
-            "under_20": 0,
-            "20-24": 0,
-            "25-29": 0,
-            "30-34": 0,
-            "35-39": 0,
-            "over_40": 0,
-        },
-        "m": {
-            "under_20": 0,
-            "20-24": 0,
-            "25-29": 0,
-            "30-34": 0,
-            "35-39": 0,
-            "over_40": 0,
-        },
-        "f": {
-            "under_20": 0,
-            "20-24": 0,
-            "25-29": 0,
-            "30-34": 0,
-            "35-39": 0,
-            "over_40": 0,
-        },
-    }
-
-    for link in job.watched_user_link:
-        user_age = get_jst_now().year - link.user.birthday.year
-        age[link.user.sex][get_age_range(user_age)] += 1
-
+    pv, sex = watch_crud.watcher_histogram(db, models.JobWatched, "job_id", job_id)
     return {
-        "favorite_user_count": favorite_user_count,
+        "favorite_user_count": job.bookmark_count,
         "pv": pv,
-        "review_count": review_count,
-        "sex": age,
+        "review_count": job.review_count,
+        "sex": sex,
+        # HyperLogLog を記録していない場合は、閲覧したユーザー数を返さない
+        "unique_viewers": (
+            watch_crud.estimate_viewers(db, models.JobViewSketch, "job_id", [job_id])
+            if viewer_sketches.enabled
+            else None
+        ),
     }
+
+
+# 日ごとの集計に含める、作成日時で数える行のモデル
+JOB_STAT_SOURCES = {"bookmarks": models.JobBookmark, "applications": models.Application}
+
+
+def rollup_job_daily_stats(db: Session) -> int:
+    """閲覧の記録を日ごとの集計に反映する。定期的に実行する"""
+    count = stats_crud.rollup_daily_stats(
+        db, models.JobDailyStat, models.JobViewLog, "job_id", JOB_STAT_SOURCES
+    )
+    db.commit()
+    return count
+
+
+def get_job_daily_impressions(
+    db: Session, job_id: int, date_from: datetime.date, date_to: datetime.date
+) -> list[dict]:
+    get_job(db, job_id)
+    return stats_crud.get_daily_stats(
+        db,
+        models.JobDailyStat,
+        "job_id",
+        job_id,
+        ["views", "unique_viewers", *JOB_STAT_SOURCES],
+        date_from,
+        date_to,
+    )
@@ -0,0 +1,97 @@
+from typing import Awaitable, Callable, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import inspect
+
+from api import models
+from api.db import listing_cache
+from api.utils.cache import invalidate_on_commit
+from api.utils.search import normalize
+
+# 一覧ごとの、結果に影響するモデル(投稿, 日時, お気に入り, レビュー, 閲覧履歴)
+LISTING_MODELS = {
+    "jobs": (
+        models.Job,
+        models.JobTime,
+        models.JobBookmark,
+        models.JobReview,
+        models.JobWatched,
+    ),
+    "events": (
+        models.Event,
+        models.EventTime,
+        models.EventBookmark,
+        models.EventReview,
+        models.EventWatched,
+    ),
+}
+
+
+def listing_key(namespace: str, common: dict, tag: str) -> tuple:
+    """一覧のキャッシュキー。キーワードは正規化し、表記揺れで別のキーにならないようにする"""
+    params = dict(common, keyword=" ".join(normalize(common["keyword"]).split()))
+    return (namespace, normalize(tag), *sorted(params.items()))
+
+
+def listing_tags(namespace: str, common: dict) -> set:
+    """一覧の結果が依存するタグ"""
+    tags = {namespace, f"{namespace}:sort:{common['sort']}"}
+    if common["user_id"] and common["target"]:
+        tags.add(f"{namespace}:user:{common['user_id']}")
+    return tags
+
+
+def watch_tags(namespace: str, user_id: int) -> set:
+    """閲覧の記録で無効化する一覧のタグ"""
+    return {
+        f"{namespace}:sort:pv",
+        f"{namespace}:sort:last_watched",
+        f"{namespace}:user:{user_id}",
+    }
+
+
+def write_tags(obj) -> set:
+    """書き込まれた行から、無効化する一覧のタグを求める"""
+    for namespace, listing_models in LISTING_MODELS.items():
+        posting, posting_time, bookmark, review, watched = listing_models
+        if isinstance(obj, (posting, posting_time)):
+            return {namespace}
+        if isinstance(obj, bookmark):
+            return {f"{namespace}:sort:favorite", f"{namespace}:user:{obj.user_id}"}
+        if isinstance(obj, review):
+            return {f"{namespace}:sort:review"}
+        if isinstance(obj, watched):
+            return watch_tags(namespace, obj.user_id)
+    if isinstance(obj, models.Application):
+        return {f"jobs:user:{obj.user_id}"}
+    if isinstance(obj, models.User) and inspect(obj).deleted:
+        # 削除されたユーザーの投稿・お気に入り・レビューは一覧全体に影響する
+        return set(LISTING_MODELS)
+    return set()
+
+
+invalidate_on_commit(listing_cache, write_tags)
+
+
+async def get_listing(
+    namespace: str,
+    common: dict,
+    tag: str,
+    adapter: TypeAdapter,
+    load: Callable[[], Awaitable[tuple[list, Optional[str]]]],
+) -> tuple[list, Optional[str]]:
+    """
+    一覧と次のページのカーソルを、キャッシュがあればキャッシュから返す。
+    キャッシュにはレスポンスのスキーマに変換した結果を保存する。
+    """
+    if not listing_cache.enabled:
+        return await load()
+    key = listing_key(namespace, common, tag)
+    cached = listing_cache.get(key)
+    if cached is not None:
+        return cached
+    stamp = listing_cache.stamp()
+    items, next_cursor = await load()
+    result = (adapter.validate_python(items, from_attributes=True), next_cursor)
+    listing_cache.set(key, result, listing_tags(namespace, common), stamp)
+    return result
@@ -0,0 +1,117 @@
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.session import Session
+from sqlalchemy.sql import Subquery
+
+from api import models
+from api.utils.search import gram_weights, keyword_grams, normalize
+
+REINDEX_BATCH_SIZE = 500
+
+
+def replace_grams(
+    db: Session,
+    gram_model,
+    owner_id_name: str,
+    owner_id: int,
+    fields: Iterable[tuple[Optional[str], int]],
+) -> None:
+    """投稿の N-gram 索引を作り直す。コミットは呼び出し元で行う"""
+    owner_column = getattr(gram_model, owner_id_name)
+    db.execute(delete(gram_model).where(owner_column == owner_id))
+    rows = [
+        {"gram": gram, owner_id_name: owner_id, "weight": weight}
+        for gram, weight in gram_weights(fields).items()
+    ]
+    if rows:
+        db.execute(insert(gram_model), rows)
+
+
+def delete_grams(db: Session, gram_model, owner_id_name: str, owner_id: int) -> None:
+    db.execute(delete(gram_model).where(getattr(gram_model, owner_id_name) == owner_id))
+
+
+def reindex(
+    db: Session,
+    posting_model,
+    index: Callable[[Session, object, list[str]], None],
+    batch_size: int = REINDEX_BATCH_SIZE,
+) -> int:
+    """
+    既存の投稿すべての N-gram 索引を作り直し、件数を返す。
+    索引を追加する前に作成された投稿を検索できるようにするため、デプロイ時に実行する
+    """
+    count = 0
+    last_id = 0
+    while True:
+        postings = db.scalars(
+            select(posting_model)
+            .options(selectinload(posting_model.tags))
+            .where(posting_model.id > last_id)
+            .order_by(posting_model.id)
+            .limit(batch_size)
+        ).all()
+        if not postings:
+            return count
+        for posting in postings:
+            index(db, posting, [tag.name for tag in posting.tags])
+        db.commit()
+        count += len(postings)
+        last_id = postings[-1].id
+        db.expunge_all()
+
+
+def backfill_tag_keys(db: Session) -> int:
+    """正規化したタグ名が未設定か、正規化の規則が変わったタグを更新し、件数を返す"""
+    rows = [
+        {"b_id": id, "b_name_key": normalize(name)}
+        for id, name, name_key in db.execute(
+            select(models.Tag.id, models.Tag.name, models.Tag.name_key)
+        )
+        if name_key != normalize(name)
+    ]
+    if rows:
+        db.execute(
+            update(models.Tag.__table__)
+            .where(models.Tag.id == bindparam("b_id"))
+            .values(name_key=bindparam("b_name_key")),
+            rows,
+        )
+        db.commit()
+    return len(rows)
+
+
+def search_scores(gram_model, owner_id_name: str, keyword: str) -> Optional[Subquery]:
+    """
+    キーワードのすべての N-gram を含む投稿の id と関連度(一致した N-gram の重みの合計)を返す副問い合わせ。
+    N-gram の並び順までは確認しないため、離れた位置で一致した投稿も含まれる。
+    キーワードが空の場合は None を返す。
+    """
+    grams = keyword_grams(keyword)
+    if not grams:
+        return None
+    conditions = [
+        (
+            gram_model.gram.startswith(gram, autoescape=True)
+            if len(gram) == 1
+            else gram_model.gram == gram
+        )
+        for gram in grams
+    ]
+    owner_column = getattr(gram_model, owner_id_name)
+    return (
+        select(owner_column.label("id"), func.sum(gram_model.weight).label("score"))
+        .where(or_(*conditions))
+        .group_by(owner_column)
+        .having(
+            and_(
+                *(
+                    func.max(case((condition, 1), else_=0)) == 1
+                    for condition in conditions
+                )
+            )
+        )
+        .subquery()
+    )
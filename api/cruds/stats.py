@@ -0,0 +1,152 @@
+import datetime
+from collections import defaultdict
+
+from sqlalchemy import (
+    Date,
+    delete,
+    distinct,
+    func,
+    insert,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.orm.session import Session
+
+from api.utils import get_jst_now
+
+
+def created_day(model):
+    return func.date(model.created_at, type_=Date)
+
+
+def rollup_daily_stats(
+    db: Session,
+    stat_model,
+    log_model,
+    owner_id_name: str,
+    sources: dict,
+) -> int:
+    """
+    閲覧の記録と、sources のモデル(列名: モデル)の作成日時から、投稿ごとの日別の集計を作り直す。
+    閲覧したユーザー数は日をまたいで合計できないため、前日以降の集計は毎回作り直し、
+    前日より前の日は、記録を削除する前に一度だけ作り直して確定する。
+    確定した後に届いた記録(書き込みに失敗して戻された閲覧など)は、確定した集計に加算する。
+    コミットは呼び出し元で行う
+    """
+    yesterday = get_jst_now().date() - datetime.timedelta(days=1)
+    start = datetime.datetime.combine(yesterday, datetime.time.min)
+    columns = ["views", "unique_viewers", *sources]
+    stats = defaultdict(lambda: dict.fromkeys(columns, 0))
+    owner_column = getattr(stat_model, owner_id_name)
+
+    old_views = {
+        (owner_id, view_day): (views, unique_viewers)
+        for owner_id, view_day, views, unique_viewers in aggregate_views(
+            db, log_model, owner_id_name, log_model.created_at < start
+        )
+    }
+    finalized = {}
+    if old_views:
+        finalized = {
+            (getattr(row, owner_id_name), row.day): row
+            for row in db.scalars(
+                select(stat_model).where(
+                    tuple_(owner_column, stat_model.day).in_(list(old_views)),
+                    stat_model.finalized,
+                )
+            )
+        }
+    for key, (views, unique_viewers) in old_views.items():
+        row = finalized.get(key)
+        if row is None:
+            # 記録が削除されていない日は、すべての記録から作り直す
+            stats[key].update(views=views, unique_viewers=unique_viewers)
+        else:
+            # 同じユーザーが確定前にも閲覧した可能性があるため、ユーザー数は大きい方とする
+            row.views += views
+            row.unique_viewers = max(row.unique_viewers, unique_viewers)
+    for owner_id, view_day, views, unique_viewers in aggregate_views(
+        db, log_model, owner_id_name, log_model.created_at >= start
+    ):
+        stats[owner_id, view_day].update(views=views, unique_viewers=unique_viewers)
+
+    rebuilt = [key for key in stats if key[1] < yesterday]
+    for name, model in sources.items():
+        source_owner = getattr(model, owner_id_name)
+        day = created_day(model)
+        conditions = [model.created_at >= start]
+        if rebuilt:
+            conditions.append(tuple_(source_owner, day).in_(rebuilt))
+        for owner_id, source_day, count in db.execute(
+            select(source_owner, day, func.count())
+            .where(or_(*conditions))
+            .group_by(source_owner, day)
+        ):
+            stats[owner_id, source_day][name] = count
+
+    db.execute(delete(stat_model).where(stat_model.day >= yesterday))
+    if rebuilt:
+        db.execute(
+            delete(stat_model).where(tuple_(owner_column, stat_model.day).in_(rebuilt))
+        )
+    if stats:
+        db.execute(
+            insert(stat_model),
+            [
+                {owner_id_name: owner_id, "day": stat_day, **values}
+                for (owner_id, stat_day), values in stats.items()
+            ],
+        )
+    db.execute(
+        update(stat_model)
+        .where(stat_model.day < yesterday, ~stat_model.finalized)
+        .values(finalized=True)
+    )
+    db.execute(delete(log_model).where(log_model.created_at < start))
+    return len(stats)
+
+
+def aggregate_views(db: Session, log_model, owner_id_name: str, *conditions):
+    """閲覧の記録を、投稿・日ごとの(閲覧数, 閲覧したユーザー数)に集計する"""
+    owner_column = getattr(log_model, owner_id_name)
+    day = created_day(log_model)
+    return db.execute(
+        select(
+            owner_column,
+            day,
+            func.sum(log_model.count),
+            func.count(distinct(log_model.user_id)),
+        )
+        .where(*conditions)
+        .group_by(owner_column, day)
+    ).all()
+
+
+def get_daily_stats(
+    db: Session,
+    stat_model,
+    owner_id_name: str,
+    owner_id: int,
+    columns: list[str],
+    date_from: datetime.date,
+    date_to: datetime.date,
+) -> list[dict]:
+    """期間の日ごとの集計を、集計のない日は 0 で埋めて返す"""
+    rows = db.execute(
+        select(
+            stat_model.day, *(getattr(stat_model, column) for column in columns)
+        ).where(
+            getattr(stat_model, owner_id_name) == owner_id,
+            stat_model.day.between(date_from, date_to),
+        )
+    ).all()
+    by_day = {row[0]: row[1:] for row in rows}
+    days = (date_to - date_from).days + 1
+    result = []
+    for i in range(days):
+        day = date_from + datetime.timedelta(days=i)
+        values = by_day.get(day, (0,) * len(columns))
+        result.append({"day": day, **dict(zip(columns, values))})
+    return result
@@ -3,19 +3,52 @@ from typing import Optional, Union
 
 from fastapi import HTTPException
 from jose import jwt
-from passlib.context import CryptContext
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached, selectinload
 from sqlalchemy.orm.session import Session
 
+import api.cruds.event as event_crud
+import api.cruds.job as job_crud
 from api import models, schemas
+from api.db import password_pool, principal_cache
 from api.utils import get_jst_now
+from api.utils.cache import invalidate_on_commit
+from api.utils.password import PasswordPoolBusy
 
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many password requests",
+        headers={"Retry-After": "1"},
+    )
+
+
+def hash_password(password: str) -> str:
+    """パスワードのハッシュ化。専用のワーカーで実行し、混雑している場合は 503 を返す"""
+    try:
+        return password_pool.hash(password)
+    except PasswordPoolBusy:
+        raise password_pool_busy() from None
 
 
 def verify_password(plain_password, hashed_password) -> bool:
-    """パスワードの検証"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """パスワードの検証。専用のワーカーで実行し、混雑している場合は 503 を返す"""
+    try:
+        return password_pool.verify(plain_password, hashed_password)
+    except PasswordPoolBusy:
+        raise password_pool_busy() from None
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """パスワードの検証。完了までリクエストのスレッドを占有しない"""
+    try:
+        return await password_pool.verify_async(plain_password, hashed_password)
+    except PasswordPoolBusy:
+        raise password_pool_busy() from None
 
 
 def authenticate_user(
@@ -30,6 +63,22 @@ def authenticate_user(
     return user
 
 
+async def authenticate_user_async(
+    db: AsyncSession, username: str, password: str
+) -> Union[bool, models.User]:
+    """ユーザーの認証"""
+    user = await db.scalar(
+        select(models.User)
+        .options(selectinload(models.User.company))
+        .where(models.User.username == username)
+    )
+    if not user:
+        return False
+    if not await verify_password_async(password, user.password):
+        return False
+    return user
+
+
 def create_access_token(
     secret_key: str, data: dict, expires_delta: Optional[timedelta] = None
 ) -> str:
@@ -61,7 +110,7 @@ def create_user_company(
 ) -> models.User:
     """ユーザーと会社の作成"""
     tmp = user_create.model_dump()
-    tmp["password"] = pwd_context.hash(tmp["password"])
+    tmp["password"] = hash_password(tmp["password"])
     company = create_company(db, user_create.company)
     tmp["company"] = company
     user = models.User(**tmp)
@@ -74,7 +123,7 @@ def create_user_company(
 def create_user(db: Session, user_create: schemas.UserCreate) -> models.User:
     """ユーザーの作成"""
     tmp = user_create.model_dump()
-    tmp["password"] = pwd_context.hash(tmp["password"])
+    tmp["password"] = hash_password(tmp["password"])
     user = models.User(**tmp)
     db.add(user)
     db.commit()
@@ -92,6 +141,59 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.username == username).first()
 
 
+def principal_tags(obj) -> set:
+    """書き込まれたユーザーのキャッシュを、変更前と変更後のユーザー名で無効化する"""
+    if not isinstance(obj, models.User):
+        return set()
+    history = inspect(obj).attrs.username.history
+    return {name for name in (obj.username, *history.deleted) if name is not None}
+
+
+invalidate_on_commit(principal_cache, principal_tags)
+
+
+def principal_values(user: models.User) -> dict:
+    return {
+        attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs
+    }
+
+
+def cached_principal(values: dict) -> models.User:
+    # リクエストごとに別のインスタンスを作り、キャッシュした値は共有しない
+    user = models.User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+def get_principal(db: Session, username: str) -> Optional[models.User]:
+    """
+    認証したユーザーを取得する。キャッシュが有効な場合は列の値をキャッシュし、
+    ヒットした場合はクエリを発行せずにセッションに加える。
+    """
+    if not principal_cache.enabled:
+        return get_user_by_username(db, username)
+    values = principal_cache.get(username)
+    if values is None:
+        stamp = principal_cache.stamp()
+        user = get_user_by_username(db, username)
+        if user is not None:
+            principal_cache.set(username, principal_values(user), {username}, stamp)
+        return user
+    return db.merge(cached_principal(values), load=False)
+
+
+async def get_principal_async(db: AsyncSession, username: str) -> Optional[models.User]:
+    """get_principal の非同期版"""
+    values = principal_cache.get(username) if principal_cache.enabled else None
+    if values is not None:
+        return await db.merge(cached_principal(values), load=False)
+    stamp = principal_cache.stamp()
+    user = await db.scalar(select(models.User).where(models.User.username == username))
+    if user is not None:
+        principal_cache.set(username, principal_values(user), {username}, stamp)
+    return user
+
+
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     """メールアドレスからユーザー情報を取得"""
     return db.query(models.User).filter(models.User.email == email).first()
@@ -127,13 +229,36 @@ def update_user(
 def update_user_password(
     db: Session, user: models.User, new_password: schemas.UserPasswordChange
 ) -> models.User:
-    user.password = pwd_context.hash(new_password.password)
+    user.password = hash_password(new_password.password)
     db.commit()
     db.refresh(user)
     return user
 
 
 def delete_user(db: Session, user: models.User) -> False:
+    # 削除されるレビュー・お気に入り・閲覧履歴の分、求人とイベントのカウンターを戻す
+    for review in user.job_reviews:
+        db.execute(
+            job_crud.job_counter_update(
+                review.job_id, review_count=-1, review_sum=-review.review_point
+            )
+        )
+    for job in user.job_bookmarks:
+        db.execute(job_crud.job_counter_update(job.id, bookmark_count=-1))
+    for link in user.job_watched_link:
+        db.execute(job_crud.job_counter_update(link.job_id, view_count=-link.count))
+    for review in user.event_reviews:
+        db.execute(
+            event_crud.event_counter_update(
+                review.event_id, review_count=-1, review_sum=-review.review_point
+            )
+        )
+    for event in user.event_bookmarks:
+        db.execute(event_crud.event_counter_update(event.id, bookmark_count=-1))
+    for link in user.event_watched_link:
+        db.execute(
+            event_crud.event_counter_update(link.event_id, view_count=-link.count)
+        )
     db.delete(user)
     db.commit()
     return True
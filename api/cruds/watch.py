@@ -0,0 +1,269 @@
+import random
+from collections import Counter
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import (
+    bindparam,
+    case,
+    exists,
+    extract,
+    func,
+    insert,
+    literal,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm.session import Session
+
+from api import models
+from api.utils import get_jst_now
+from api.utils.hll import HyperLogLog
+
+# 閲覧したユーザーの年齢層(ラベル, 上限の年齢)。上限のない最後の年齢層は over_40
+AGE_RANGES = (
+    ("under_20", 20),
+    ("20-24", 25),
+    ("25-29", 30),
+    ("30-34", 35),
+    ("35-39", 40),
+)
+SEXES = ("o", "m", "f")
+
+
+def upsert_views(
+    db: Session,
+    watched_model,
+    posting_model,
+    owner_id_name: str,
+    views: dict[tuple[int, int], tuple[int, datetime]],
+    log_model=None,
+) -> Counter:
+    """
+    (ユーザー id, 投稿 id) ごとに集約した閲覧(回数, 最後に閲覧した日時)を、閲覧履歴に 1 文でまとめて書き込む。
+    updated_at は閲覧した日時とし、最近見た順の並びを書き込みの時刻で崩さない。
+    log_model を指定した場合は、閲覧の記録にも追加する。
+    削除済みのユーザー・投稿への閲覧は捨て、書き込んだ閲覧数を投稿ごとに返す。
+    コミットは呼び出し元で行う
+    """
+    user_ids = {user_id for user_id, _ in views}
+    owner_ids = {owner_id for _, owner_id in views}
+    user_ids &= set(
+        db.scalars(select(models.User.id).where(models.User.id.in_(user_ids)))
+    )
+    owner_ids &= set(
+        db.scalars(select(posting_model.id).where(posting_model.id.in_(owner_ids)))
+    )
+    rows = [
+        {
+            "user_id": user_id,
+            owner_id_name: owner_id,
+            "count": count,
+            "created_at": at,
+            "updated_at": at,
+        }
+        for (user_id, owner_id), (count, at) in views.items()
+        if user_id in user_ids and owner_id in owner_ids
+    ]
+    if not rows:
+        return Counter()
+
+    table = watched_model.__table__
+    if db.get_bind().dialect.name == "mysql":
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            count=table.c["count"] + stmt.inserted["count"],
+            updated_at=func.greatest(table.c.updated_at, stmt.inserted.updated_at),
+        )
+    else:
+        stmt = sqlite.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c[owner_id_name]],
+            set_={
+                "count": table.c["count"] + stmt.excluded["count"],
+                "updated_at": func.max(table.c.updated_at, stmt.excluded.updated_at),
+            },
+        )
+    db.execute(stmt, rows)
+    if log_model is not None:
+        db.execute(insert(log_model), rows)
+
+    counts = Counter()
+    for row in rows:
+        counts[row[owner_id_name]] += row["count"]
+    return counts
+
+
+def shard_increment(
+    shard_model, owner_id_name: str, owner_id: int, count: int, shards: int
+):
+    """ランダムに選んだシャードの閲覧数を加算する UPDATE 文を作成する"""
+    return (
+        update(shard_model)
+        .where(
+            getattr(shard_model, owner_id_name) == owner_id,
+            shard_model.shard == random.randrange(shards),
+        )
+        .values(count=shard_model.count + count)
+    )
+
+
+def create_shards(
+    db: Session,
+    shard_model,
+    posting_model,
+    owner_id_name: str,
+    shards: int,
+    *conditions
+) -> None:
+    """条件に一致する投稿のうち、シャードの行がないものに作成する。コミットは呼び出し元で行う"""
+    owner_column = getattr(shard_model, owner_id_name)
+    for shard in range(shards):
+        missing = select(posting_model.id, literal(shard), literal(0)).where(
+            *conditions,
+            ~exists().where(
+                owner_column == posting_model.id, shard_model.shard == shard
+            ),
+        )
+        db.execute(
+            insert(shard_model).from_select([owner_id_name, "shard", "count"], missing)
+        )
+
+
+def compact_shards(db: Session, shard_model, owner_id_name: str) -> Counter:
+    """
+    シャードの閲覧数を取り出して 0 に戻し、投稿ごとの合計を返す。
+    取り出した値だけを減算するため、同時に加算された閲覧数は失われない。
+    コミットは呼び出し元で行う
+    """
+    table = shard_model.__table__
+    owner_column = table.c[owner_id_name]
+    rows = db.execute(
+        select(owner_column, table.c.shard, table.c["count"]).where(
+            table.c["count"] != 0
+        )
+    ).all()
+    if not rows:
+        return Counter()
+    db.execute(
+        update(table)
+        .where(
+            owner_column == bindparam("b_owner_id"),
+            table.c.shard == bindparam("b_shard"),
+        )
+        .values(count=table.c["count"] - bindparam("b_count")),
+        [
+            {"b_owner_id": owner_id, "b_shard": shard, "b_count": count}
+            for owner_id, shard, count in rows
+        ],
+    )
+    totals = Counter()
+    for owner_id, _, count in rows:
+        totals[owner_id] += count
+    return totals
+
+
+def shard_total(shard_model, owner_id_name: str, owner_id: int):
+    """まだ集約されていないシャードの閲覧数の合計を返す副問い合わせ"""
+    return (
+        select(func.coalesce(func.sum(shard_model.count), 0))
+        .where(getattr(shard_model, owner_id_name) == owner_id)
+        .scalar_subquery()
+    )
+
+
+def watcher_histogram(
+    db: Session, watched_model, owner_id_name: str, owner_id: int
+) -> tuple[int, dict]:
+    """
+    投稿を閲覧したユーザーの数と、性別・年齢層ごとの人数を 1 回の GROUP BY で求める。
+    年齢は現在の年と生年の差とする
+    """
+    age = get_jst_now().year - extract("year", models.User.birthday)
+    age_range = case(
+        (models.User.birthday.is_(None), None),
+        *((age < upper, label) for label, upper in AGE_RANGES),
+        else_="over_40",
+    ).label("age_range")
+    rows = db.execute(
+        select(models.User.sex, age_range, func.count())
+        .select_from(watched_model)
+        .join(models.User, models.User.id == watched_model.user_id)
+        .where(getattr(watched_model, owner_id_name) == owner_id)
+        .group_by(models.User.sex, age_range)
+    ).all()
+    histogram = {
+        sex: {label: 0 for label in [*dict(AGE_RANGES), "over_40"]} for sex in SEXES
+    }
+    for sex, label, count in rows:
+        if sex in histogram and label is not None:
+            histogram[sex][label] += count
+    return sum(count for _, _, count in rows), histogram
+
+
+def merge_sketches(
+    db: Session,
+    sketch_model,
+    posting_model,
+    owner_id_name: str,
+    sketches: dict[tuple[int, date], HyperLogLog],
+) -> None:
+    """
+    (投稿 id, 日付) ごとの HyperLogLog を、保存済みのものと合併して書き込む。
+    削除済みの投稿のものは捨てる。コミットは呼び出し元で行う
+    """
+    owner_column = getattr(sketch_model, owner_id_name)
+    owner_ids = set(
+        db.scalars(
+            select(posting_model.id).where(
+                posting_model.id.in_({owner_id for owner_id, _ in sketches})
+            )
+        )
+    )
+    sketches = {key: sketch for key, sketch in sketches.items() if key[0] in owner_ids}
+    if not sketches:
+        return
+    stored = db.scalars(
+        select(sketch_model)
+        .where(tuple_(owner_column, sketch_model.day).in_(list(sketches)))
+        .with_for_update()
+    )
+    for row in stored:
+        sketch = sketches.pop((getattr(row, owner_id_name), row.day))
+        sketch.merge(HyperLogLog.from_bytes(row.registers))
+        row.registers = sketch.to_bytes()
+    db.add_all(
+        sketch_model(**{owner_id_name: owner_id}, day=day, registers=sketch.to_bytes())
+        for (owner_id, day), sketch in sketches.items()
+    )
+
+
+def estimate_viewers(
+    db: Session,
+    sketch_model,
+    owner_id_name: str,
+    owner_ids: list[int],
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> Optional[int]:
+    """
+    投稿・期間の HyperLogLog を合併し、重複を除いた閲覧ユーザー数を推定する。
+    HyperLogLog がない場合は、閲覧がなかったのか記録していないのか区別できないため None を返す
+    """
+    stmt = select(sketch_model.registers).where(
+        getattr(sketch_model, owner_id_name).in_(owner_ids)
+    )
+    if date_from is not None:
+        stmt = stmt.where(sketch_model.day >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(sketch_model.day <= date_to)
+    merged = None
+    for registers in db.scalars(stmt):
+        sketch = HyperLogLog.from_bytes(registers)
+        if merged is None:
+            merged = sketch
+        else:
+            merged.merge(sketch)
+    return merged.count() if merged is not None else None
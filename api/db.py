@@ -6,10 +6,21 @@ from dotenv import load_dotenv
 from passlib.context import CryptContext
 from sqlalchemy import Column, DateTime, create_engine
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from api.config import DBConfig
 from api.utils import get_jst_now
+from api.utils.cache import ResultCache
+from api.utils.hll import SketchBuffer
+from api.utils.lazyload import lazy_load_detector
+from api.utils.password import PasswordPool
+from api.utils.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+from api.utils.query_stats import instrument_engine
+from api.utils.routing import RoutingSession, WriteTracker
+from api.utils.slow_query import SlowQueryLog
+from api.utils.view_buffer import ViewBuffer
 
 load_dotenv()
 
@@ -18,12 +29,104 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = os.getenv("DB_PORT", "3306")
 
-DB_URL = (
-    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/demo?charset=utf8"
+
+def make_db_url(driver: str, host: str = DB_HOST, port: str = DB_PORT) -> str:
+    return f"mysql+{driver}://{DB_USER}:{DB_PASSWORD}@{host}:{port}/demo?charset=utf8"
+
+
+DB_URL = make_db_url("pymysql")
+ASYNC_DB_URL = make_db_url("aiomysql")
+
+db_config = DBConfig()
+pool_options = {
+    "pool_size": db_config.DB_POOL_SIZE,
+    "max_overflow": db_config.DB_MAX_OVERFLOW,
+    "pool_timeout": db_config.DB_POOL_TIMEOUT,
+    "pool_recycle": db_config.DB_POOL_RECYCLE,
+    "pool_pre_ping": db_config.DB_POOL_PRE_PING,
+}
+replica_hosts = [
+    host.strip().partition(":")
+    for host in db_config.DB_REPLICA_HOSTS.split(",")
+    if host.strip()
+]
+write_tracker = WriteTracker(db_config.DB_READ_YOUR_WRITES_SECONDS)
+
+engine = create_engine(
+    DB_URL, echo=False, poolclass=InstrumentedQueuePool, **pool_options
+)
+replica_engines = [
+    create_engine(
+        make_db_url("pymysql", host, port or DB_PORT),
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        **pool_options,
+    )
+    for host, _, port in replica_hosts
+]
+Session = sessionmaker(
+    class_=RoutingSession,
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
+    replicas=replica_engines,
+    tracker=write_tracker,
 )
 
-engine = create_engine(DB_URL, echo=False)
-Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 読み込みの多いエンドポイント用の非同期エンジン
+# コミット後も属性を参照できるよう expire_on_commit=False とする
+async_engine = create_async_engine(
+    ASYNC_DB_URL, echo=False, poolclass=InstrumentedAsyncQueuePool, **pool_options
+)
+async_replica_engines = [
+    create_async_engine(
+        make_db_url("aiomysql", host, port or DB_PORT),
+        echo=False,
+        poolclass=InstrumentedAsyncQueuePool,
+        **pool_options,
+    )
+    for host, _, port in replica_hosts
+]
+async_session = async_sessionmaker(
+    sync_session_class=RoutingSession,
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    replicas=[replica.sync_engine for replica in async_replica_engines],
+    tracker=write_tracker,
+)
+sync_engines = [
+    engine,
+    *replica_engines,
+    async_engine.sync_engine,
+    *[replica.sync_engine for replica in async_replica_engines],
+]
+if db_config.DB_QUERY_STATS:
+    for sync_engine in sync_engines:
+        instrument_engine(sync_engine)
+
+slow_query_log = SlowQueryLog(
+    db_config.DB_SLOW_QUERY_MS, maxlen=db_config.DB_SLOW_QUERY_LOG_SIZE
+)
+if db_config.DB_SLOW_QUERY_MS is not None:
+    for sync_engine in sync_engines:
+        slow_query_log.instrument(sync_engine)
+listing_cache = ResultCache(
+    db_config.LISTING_CACHE_TTL, maxsize=db_config.LISTING_CACHE_SIZE
+)
+principal_cache = ResultCache(
+    db_config.PRINCIPAL_CACHE_TTL, maxsize=db_config.PRINCIPAL_CACHE_SIZE
+)
+password_pool = PasswordPool(
+    db_config.PASSWORD_HASH_WORKERS,
+    db_config.PASSWORD_HASH_QUEUE,
+    processes=db_config.PASSWORD_HASH_PROCESSES,
+)
+view_buffer = ViewBuffer(db_config.VIEW_FLUSH_SECONDS)
+viewer_sketches = SketchBuffer(db_config.VIEWER_SKETCH_SECONDS)
+if db_config.DB_LAZY_LOAD_DETECTION != "off":
+    lazy_load_detector.enable(db_config.DB_LAZY_LOAD_DETECTION)
 
 Base = declarative_base()
 
@@ -1,18 +1,27 @@
+from datetime import datetime
 from functools import lru_cache
-from typing import Annotated, Literal
+from typing import Annotated, AsyncIterator, Iterator, Literal, Optional
 
-from fastapi import Depends, HTTPException, Request
+from fastapi import Depends, HTTPException, Query
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm.session import Session
 
 import api.cruds.user as user_crud
 from api import config, models, schemas
+from api.db import Session as SessionFactory
+from api.db import async_session
+from api.utils.routing import set_principal
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
+# ログインしていなくても利用できるエンドポイント用
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl="api/v1/auth/token", auto_error=False
+)
 
 
 @lru_cache
@@ -30,27 +39,61 @@ def get_test_config():
     return config.TestConfig()
 
 
-def get_db(request: Request) -> Session:
-    return request.state.db
+def get_db() -> Iterator[Session]:
+    """
+    セッションを取得する。
+    セッションはこの依存関係を要求するエンドポイントでのみ作成され、レスポンス後に閉じられる。
+    同一リクエスト内では同じセッションが共有される。
+    """
+    db = SessionFactory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """
+    非同期セッションのファクトリを取得する。
+    リクエストより長く続く可能性がある処理で、専用のセッションを開くために使用する。
+    """
+    return async_session
+
+
+async def get_async_db(
+    session_factory: async_sessionmaker = Depends(get_async_sessionmaker),
+) -> AsyncIterator[AsyncSession]:
+    """
+    非同期セッションを取得する。
+    読み込み専用の async エンドポイントで使用する。
+    """
+    async with session_factory() as db:
+        yield db
 
 
 def common_parameters(
-    db: Session = Depends(get_db),
     keyword: str = "",
-    sort: Literal["review", "favorite", "recent", "id", "pv", "last_watched"] = "id",
+    sort: Literal[
+        "review", "favorite", "recent", "id", "pv", "last_watched", "relevance"
+    ] = "id",
     order: str = "asc",
     offset: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    time_from: Annotated[Optional[datetime], Query(alias="from")] = None,
+    time_to: Annotated[Optional[datetime], Query(alias="to")] = None,
     status: Literal["all", "active", "inactive", "draft", "posted"] = "all",
     user_id: int = None,
     target: Literal["favorite", "history", "posted", "apply"] = None,
 ):
     return {
-        "db": db,
         "sort": sort,
         "order": order,
         "offset": offset,
         "limit": limit,
+        "cursor": cursor,
+        "time_from": time_from,
+        "time_to": time_to,
         "status": status,
         "keyword": keyword,
         "user_id": user_id,
@@ -58,32 +101,77 @@ def common_parameters(
     }
 
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme),
-    settings: config.BaseConfig = Depends(get_config),
-) -> models.User:
+def credentials_exception() -> HTTPException:
+    return HTTPException(status_code=401, detail="Could not validate credentials")
+
+
+def decode_username(token: str, settings: config.BaseConfig) -> str:
     """
-    トークンからユーザーを取得する。
+    トークンからユーザー名を取得する。
     トークン列が不正な場合は、HTTPException(status_code=401) を返す。
     """
-    credentials_exception = HTTPException(
-        status_code=401, detail="Could not validate credentials"
-    )
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise credentials_exception()
         token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
-    user = user_crud.get_user_by_username(db, username=token_data.username)
+        raise credentials_exception()
+    return token_data.username
+
+
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    settings: config.BaseConfig = Depends(get_config),
+) -> models.User:
+    """
+    トークンからユーザーを取得する。
+    トークン列が不正な場合は、HTTPException(status_code=401) を返す。
+    """
+    username = decode_username(token, settings)
+    # 直前に書き込んだユーザーの読み込みはプライマリから行う
+    set_principal(db, username)
+    user = user_crud.get_principal(db, username)
+    if user is None:
+        raise credentials_exception()
+    return user
+
+
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme),
+    settings: config.BaseConfig = Depends(get_config),
+) -> models.User:
+    """
+    get_current_user の非同期版。async エンドポイントで、スレッドプールを使わずにユーザーを取得する。
+    """
+    username = decode_username(token, settings)
+    set_principal(db.sync_session, username)
+    user = await user_crud.get_principal_async(db, username)
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
     return user
 
 
+async def get_optional_user(
+    db: AsyncSession = Depends(get_async_db),
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    settings: config.BaseConfig = Depends(get_config),
+) -> Optional[models.User]:
+    """
+    トークンがある場合はユーザーを取得し、ない場合は None を返す。
+    ログインしていなくても利用できるエンドポイント用のため、トークンが不正・期限切れの場合も None を返す。
+    """
+    if token is None:
+        return None
+    try:
+        return await get_current_user_async(db, token, settings)
+    except HTTPException:
+        return None
+
+
 def get_current_active_user(
     settings: Annotated[config.BaseConfig, Depends(get_config)],
     current_user: models.User = Depends(get_current_user),
@@ -93,6 +181,15 @@ def get_current_active_user(
     return current_user
 
 
+async def get_current_active_user_async(
+    settings: Annotated[config.BaseConfig, Depends(get_config)],
+    current_user: models.User = Depends(get_current_user_async),
+) -> models.User:
+    if not current_user.is_active and settings.IS_PRODUCT:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
 def get_general_user(
     current_user: models.User = Depends(get_current_active_user),
 ):
@@ -1,13 +1,30 @@
+import asyncio
+import logging
 import os
 import secrets
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Callable
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
+import api.cruds.event as event_crud
+import api.cruds.job as job_crud
 from api import routers
-from api.db import Session
+from api.cruds.listing import watch_tags
+from api.db import (
+    Session,
+    db_config,
+    listing_cache,
+    password_pool,
+    view_buffer,
+    viewer_sketches,
+)
+from api.utils.lazyload import lazy_load_detector
+from api.utils.query_stats import QueryStatsMiddleware
 
 
 def initialize():
@@ -21,26 +38,177 @@ def initialize():
         os.environ["SECRET_KEY"] = secret_key
 
 
+logger = logging.getLogger(__name__)
+
+
+def sweep_next_start_times():
+    with Session() as db:
+        jobs = job_crud.sweep_next_start_times(db)
+        events = event_crud.sweep_next_start_times(db)
+    # 一括の書き込みは flush のイベントで検出されないため、ここで一覧のキャッシュを無効化する
+    # next_start_time はすべての一覧に含まれるため、並び順によらず無効化する
+    listing_cache.invalidate(
+        {
+            namespace
+            for namespace, count in (("jobs", jobs), ("events", events))
+            if count
+        }
+    )
+    logger.info("next_start_time swept: jobs=%d events=%d", jobs, events)
+
+
+def compact_view_shards():
+    with Session() as db:
+        jobs = job_crud.compact_job_view_shards(db)
+        events = event_crud.compact_event_view_shards(db)
+    # 一括の書き込みは flush のイベントで検出されないため、ここで一覧のキャッシュを無効化する
+    listing_cache.invalidate(
+        {
+            f"{namespace}:sort:pv"
+            for namespace, count in (("jobs", jobs), ("events", events))
+            if count
+        }
+    )
+    logger.info("view shards compacted: jobs=%d events=%d", jobs, events)
+
+
+def rollup_daily_stats():
+    with Session() as db:
+        jobs = job_crud.rollup_job_daily_stats(db)
+        events = event_crud.rollup_event_daily_stats(db)
+    logger.info("daily stats rolled up: jobs=%d events=%d", jobs, events)
+
+
+def flush_views():
+    """バッファに集約した閲覧をまとめて書き込む。失敗した場合はバッファに戻す"""
+    views = view_buffer.drain()
+    if not views:
+        return
+    try:
+        with Session() as db:
+            job_crud.flush_job_views(
+                db, {key[1:]: view for key, view in views.items() if key[0] == "jobs"}
+            )
+            event_crud.flush_event_views(
+                db,
+                {key[1:]: view for key, view in views.items() if key[0] == "events"},
+            )
+            db.commit()
+    except Exception:
+        view_buffer.restore(views)
+        raise
+    # 一括の書き込みは flush のイベントで検出されないため、ここで一覧のキャッシュを無効化する
+    listing_cache.invalidate(
+        set().union(
+            *(watch_tags(namespace, user_id) for namespace, user_id, _ in views)
+        )
+    )
+
+
+def flush_viewer_sketches():
+    """バッファの HyperLogLog を書き込む。失敗した場合はバッファに戻す"""
+    sketches = viewer_sketches.drain()
+    if not sketches:
+        return
+    try:
+        with Session() as db:
+            job_crud.merge_job_view_sketches(
+                db,
+                {
+                    key[1:]: sketch
+                    for key, sketch in sketches.items()
+                    if key[0] == "jobs"
+                },
+            )
+            event_crud.merge_event_view_sketches(
+                db,
+                {
+                    key[1:]: sketch
+                    for key, sketch in sketches.items()
+                    if key[0] == "events"
+                },
+            )
+            db.commit()
+    except Exception:
+        viewer_sketches.restore(sketches)
+        raise
+
+
+async def run_periodically(interval: float, fn: Callable[[], None]):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(fn)
+        except Exception:
+            logger.exception("%s failed", fn.__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if db_config.NEXT_START_SWEEP_SECONDS:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically(
+                    db_config.NEXT_START_SWEEP_SECONDS, sweep_next_start_times
+                )
+            )
+        )
+    if db_config.VIEW_COUNTER_SHARDS:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically(
+                    db_config.VIEW_SHARD_COMPACT_SECONDS, compact_view_shards
+                )
+            )
+        )
+    if db_config.IMPRESSION_ROLLUP_SECONDS:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically(
+                    db_config.IMPRESSION_ROLLUP_SECONDS, rollup_daily_stats
+                )
+            )
+        )
+    if view_buffer.enabled:
+        tasks.append(
+            asyncio.create_task(run_periodically(view_buffer.interval, flush_views))
+        )
+    if viewer_sketches.enabled:
+        tasks.append(
+            asyncio.create_task(
+                run_periodically(viewer_sketches.interval, flush_viewer_sketches)
+            )
+        )
+    yield
+    for task in tasks:
+        task.cancel()
+    # 終了時に残っている閲覧を書き込む
+    if view_buffer.enabled:
+        await run_in_threadpool(flush_views)
+    if viewer_sketches.enabled:
+        await run_in_threadpool(flush_viewer_sketches)
+    await run_in_threadpool(password_pool.shutdown)
+
+
 def create_app():
     initialize()
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=os.getenv("ALLOW_ORIGINS", "*"),
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
-
-    @app.middleware("http")
-    async def db_session_middleware(request: Request, call_next):
-        response = Response("Internal server error", status_code=500)
-        try:
-            request.state.db = Session()
-            response = await call_next(request)
-        finally:
-            request.state.db.close()
-        return response
+    if (
+        db_config.DB_QUERY_STATS
+        or db_config.DB_SLOW_QUERY_MS is not None
+        or lazy_load_detector.enabled
+    ):
+        # スロークエリログと遅延読み込みの検出は、記録にリクエストのルートを使用する
+        app.add_middleware(QueryStatsMiddleware, report=db_config.DB_QUERY_STATS)
 
     app.include_router(routers.router)
 
@@ -1,4 +1,17 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Computed,
+    Date,
+    DateTime,
+    Double,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
 from sqlalchemy.orm import relationship
 
 from api.db import BaseModel
@@ -6,6 +19,13 @@ from api.utils import get_jst_now
 
 
 class JobTime(BaseModel):
+    # 期間の重なりで絞り込むため、開始・終了のどちらからでも範囲検索できるようにする
+    # 日時の長さは MAX_SLOT_DURATION 以内とし、開始日時の範囲を狭く保つ
+    __table_args__ = (
+        Index("ix_job_times_start_end", "start_time", "end_time", "job_id"),
+        Index("ix_job_times_end_start", "end_time", "start_time", "job_id"),
+    )
+
     id = Column(Integer, primary_key=True)
     job_id = Column(Integer, ForeignKey("jobs.id", ondelete="CASCADE"))
     start_time = Column(DateTime)
@@ -55,6 +75,80 @@ class JobWatched(BaseModel):
     job = relationship("Job", back_populates="watched_user_link")
 
 
+class JobSearchGram(BaseModel):
+    """キーワード検索用の N-gram 索引。gram は大文字小文字を区別して比較する"""
+
+    __tablename__ = "job_search_grams"
+
+    gram = Column(
+        String(2).with_variant(String(2, collation="utf8mb4_bin"), "mysql"),
+        primary_key=True,
+    )
+    job_id = Column(
+        Integer,
+        ForeignKey("jobs.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    weight = Column(Integer, default=0)
+
+
+class JobViewShard(BaseModel):
+    """
+    閲覧数を分割して加算するカウンター。同じ行への更新の競合を避けるため、加算ごとにシャードを選ぶ。
+    合計は定期的に Job.view_count に集約する
+    """
+
+    __tablename__ = "job_view_shards"
+
+    job_id = Column(
+        Integer, ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True
+    )
+    shard = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, server_default="0")
+
+
+class JobViewLog(BaseModel):
+    """閲覧の記録。日ごとの集計(JobDailyStat)に反映した後、前日より前の行は削除する"""
+
+    __tablename__ = "job_view_logs"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("jobs.id", ondelete="CASCADE"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    count = Column(Integer, default=1)
+    created_at = Column(DateTime, default=get_jst_now, index=True)
+
+
+class JobDailyStat(BaseModel):
+    """求人ごとの日別の閲覧数・閲覧したユーザー数・お気に入り登録数・応募数"""
+
+    __tablename__ = "job_daily_stats"
+
+    job_id = Column(
+        Integer, ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+    views = Column(Integer, default=0, server_default="0")
+    unique_viewers = Column(Integer, default=0, server_default="0")
+    bookmarks = Column(Integer, default=0, server_default="0")
+    applications = Column(Integer, default=0, server_default="0")
+    # 前日より前の日の集計が確定し、閲覧の記録を削除した後は True
+    finalized = Column(Boolean, default=False, server_default="0")
+
+
+class JobViewSketch(BaseModel):
+    """求人を閲覧したユーザーの日ごとの HyperLogLog。期間や求人をまたいで合併し、閲覧したユーザー数を推定する"""
+
+    __tablename__ = "job_view_sketches"
+
+    job_id = Column(
+        Integer, ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+    registers = Column(LargeBinary)
+
+
 class Job(BaseModel):
     id = Column(Integer, primary_key=True)
     name = Column(String(255))
@@ -70,6 +164,19 @@ class Job(BaseModel):
     status = Column(String(10), default="draft")
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     purchase_id = Column(Integer, ForeignKey("purchases.id"))
+    # 人気順の並び替え用に、お気に入り・閲覧・レビューの件数を書き込み時に更新して保持する
+    bookmark_count = Column(Integer, default=0, server_default="0", index=True)
+    view_count = Column(Integer, default=0, server_default="0", index=True)
+    review_count = Column(Integer, default=0, server_default="0")
+    review_sum = Column(Integer, default=0, server_default="0")
+    # カーソルの値と一致を比較するため、単精度の Float ではなく Double とする
+    review_average = Column(
+        Double,
+        Computed("COALESCE(review_sum * 1.0 / NULLIF(review_count, 0), 0)"),
+        index=True,
+    )
+    # 開始日時が現在以降の仕事日時のうち最も早いもの。日時の更新時と定期的な掃除で再計算する
+    next_start_time = Column(DateTime, index=True)
 
     author = relationship("User", back_populates="job_postings")
     job_times = relationship(
@@ -107,8 +214,6 @@ class Job(BaseModel):
 
     @property
     def average_review_point(self):
-        if len(self.reviews) == 0:
+        if not self.review_count:
             return 0
-        return round(
-            sum([review.review_point for review in self.reviews]) / len(self.reviews), 1
-        )
+        return round(self.review_sum / self.review_count, 1)
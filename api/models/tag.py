@@ -2,11 +2,18 @@ from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import relationship
 
 from api.db import BaseModel
+from api.utils.search import normalize
+
+
+def name_key_default(context):
+    return normalize(context.get_current_parameters()["name"])
 
 
 class Tag(BaseModel):
     id = Column(Integer, primary_key=True)
     name = Column(String(255))
+    # 表記揺れを吸収して絞り込むための正規化したタグ名
+    name_key = Column(String(255), default=name_key_default, index=True)
 
     events = relationship("Event", secondary="event_tags", back_populates="tags")
     jobs = relationship("Job", secondary="job_tags", back_populates="tags")
@@ -0,0 +1,19 @@
+import api.cruds.event as event_crud
+import api.cruds.job as job_crud
+import api.cruds.search as search_crud
+from api.db import Session
+
+
+def reindex_search():
+    """キーワード検索の索引と正規化したタグ名を、既存のデータから作り直す"""
+    with Session() as db:
+        tags = search_crud.backfill_tag_keys(db)
+        print(f"タグ名を正規化しました: {tags}件")
+        jobs = job_crud.reindex_jobs(db)
+        print(f"求人の索引を作成しました: {jobs}件")
+        events = event_crud.reindex_events(db)
+        print(f"イベントの索引を作成しました: {events}件")
+
+
+if __name__ == "__main__":
+    reindex_search()
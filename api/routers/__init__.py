@@ -6,10 +6,11 @@ from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 
 from ..dependencies import get_company_user
 from ..utils import get_jst_now
-from . import auth, event, job, notice, plan, tag, user
+from . import admin, auth, event, job, notice, plan, tag, user
 
 router = APIRouter(prefix=os.getenv("PREFIX", "/api/v1"))
 
+router.include_router(admin.router)
 router.include_router(auth.router)
 router.include_router(event.router)
 router.include_router(job.router)
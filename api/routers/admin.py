@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends
+
+from api import models
+from api.db import (
+    async_engine,
+    async_replica_engines,
+    engine,
+    replica_engines,
+    slow_query_log,
+)
+from api.dependencies import get_admin_user
+from api.utils.pool import get_pool_status
+
+router = APIRouter(prefix="/admin", tags=["管理者"])
+
+
+@router.get("/db/pool", summary="コネクションプールの状態取得")
+def get_db_pool_status(
+    current_user: models.User = Depends(get_admin_user),
+):
+    """
+    コネクションプールの使用状況と、接続取得の待ち時間の統計を取得する。
+    プールサイズの調整に使用する。
+
+        - checked_out: 使用中の接続数
+        - overflow: プールサイズを超えて作成されている接続数(負の場合は未作成の枠)
+        - wait: 接続取得の待ち時間(ミリ秒)のヒストグラム
+    """
+    return {
+        "sync": get_pool_status(engine.pool),
+        "async": get_pool_status(async_engine.sync_engine.pool),
+        "replicas": [get_pool_status(replica.pool) for replica in replica_engines],
+        "async_replicas": [
+            get_pool_status(replica.sync_engine.pool)
+            for replica in async_replica_engines
+        ],
+    }
+
+
+@router.delete("/db/pool", summary="コネクションプールの統計リセット")
+def reset_db_pool_stats(
+    current_user: models.User = Depends(get_admin_user),
+):
+    """
+    接続取得の待ち時間の統計をリセットする。
+    """
+    for pool in [engine.pool, async_engine.sync_engine.pool]:
+        pool.stats.reset()
+    for replica in replica_engines:
+        replica.pool.stats.reset()
+    for replica in async_replica_engines:
+        replica.sync_engine.pool.stats.reset()
+    return {"message": "Pool stats reset"}
+
+
+@router.get("/db/slow-queries", summary="スロークエリ一覧取得")
+def get_slow_queries(
+    current_user: models.User = Depends(get_admin_user),
+):
+    """
+    実行時間が DB_SLOW_QUERY_MS を超えたSQLを新しい順に取得する。
+    SQL、バインドパラメーター、発行元のルート、実行計画(SELECTのみ)を含む。
+    DB_SLOW_QUERY_MS が未設定の場合は記録されない。
+    """
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.entries(),
+    }
+
+
+@router.delete("/db/slow-queries", summary="スロークエリの記録削除")
+def clear_slow_queries(
+    current_user: models.User = Depends(get_admin_user),
+):
+    """
+    記録されたスロークエリを削除する。
+    """
+    slow_query_log.clear()
+    return {"message": "Slow queries cleared"}
@@ -16,11 +16,12 @@ from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
 from jinja2 import Template
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm.session import Session
 
 import api.cruds.user as user_crud
 from api import config, schemas
-from api.dependencies import get_config, get_current_user, get_db
+from api.dependencies import get_async_db, get_config, get_current_user, get_db
 from api.utils import send_email
 
 router = APIRouter(prefix="/auth", tags=["認証"])
@@ -32,15 +33,18 @@ templates = Jinja2Templates(directory=HTML_DIR)
 
 
 @router.post("/token", response_model=schemas.Token, summary="ログインを行い、アクセストークンを返す")
-def login_for_access_token(
+async def login_for_access_token(
     settings: Annotated[config.BaseConfig, Depends(get_config)],
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> dict:
     """
-    フォームからユーザー名とパスワードを受け取り、アクセストークンを返す
+    フォームからユーザー名とパスワードを受け取り、アクセストークンを返す。
+    パスワードの検証は専用のワーカーで行い、混雑している場合は 503 を返す
     """
-    user = user_crud.authenticate_user(db, form_data.username, form_data.password)
+    user = await user_crud.authenticate_user_async(
+        db, form_data.username, form_data.password
+    )
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     # if not user.is_active and settings.IS_PRODUCT:
@@ -1,19 +1,33 @@
+from datetime import date, timedelta
 from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm.session import Session
 
 import api.cruds.event as event_crud
+import api.cruds.listing as listing_crud
 import api.cruds.plan as plan_crud
 import api.cruds.tag as tag_crud
 from api import models, schemas
+from api.db import write_tracker
 from api.dependencies import (
     common_parameters,
     get_admin_user,
+    get_async_db,
+    get_async_sessionmaker,
     get_company_user,
     get_current_active_user,
+    get_current_active_user_async,
     get_db,
+    get_optional_user,
 )
+from api.utils import get_jst_now
+from api.utils.routing import set_principal
+from api.utils.singleflight import single_flight
+
+event_list_adapter = TypeAdapter(list[schemas.EventListView])
 
 router = APIRouter(prefix="/events", tags=["イベント"])
 
@@ -35,22 +49,29 @@ def create_event(
 
 
 @router.get("/", response_model=list[schemas.EventListView], summary="イベント一覧取得")
-def get_events(
+async def get_events(
     common: Annotated[dict, Depends(common_parameters)],
+    response: Response,
     tag: str = "",
+    current_user: Optional[models.User] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     ## イベントの一覧を取得する。
 
         - limit: 取得するイベントの最大数を指定する。デフォルトは100。
         - offset: 取得するイベントの開始位置を指定する。デフォルトは0。
-        - sort: ソートする項目を指定する。デフォルトはid。
+        - cursor: 前のページのレスポンスヘッダー X-Next-Cursor の値を指定すると、その続きから取得する。
+        - from, to: 指定した場合は、その期間と重なる日時があるイベントを取得する。
+        - sort: ソートする項目を指定する。デフォルトはid。relevance を指定すると、キーワードとの関連度順に並べる。
         - order: ソート順を指定する。デフォルトはasc。(現状機能していない)
-        - keyword: キーワードを指定する。指定した場合は、タイトルとタグのどちらかにキーワードが含まれるイベントを取得する。
+        - keyword: キーワードを指定する。指定した場合は、名前・説明・住所・タグにキーワードが含まれるイベントを取得する。
         - status: ステータスを指定する。デフォルトはall。
         - user_id: ユーザーIDを指定する。
         - target: 絞り込み内容を指定する。user_idを指定しないと無視される。
 
+        ログインしている場合は、お気に入り登録しているかどうか(is_favorite)を返す。
+
 
     ## status:
 
@@ -67,7 +88,32 @@ def get_events(
         - favorite: お気に入り登録しているイベントを取得する。
         - posted: 自分が作成したイベントを取得する。
     """
-    return event_crud.get_events(**common, tag_name=tag)
+    events, next_cursor = await listing_crud.get_listing(
+        "events",
+        common,
+        tag,
+        event_list_adapter,
+        lambda: event_crud.get_events_async(db, **common, tag_name=tag),
+    )
+    if current_user is not None:
+        events = await mark_favorite_events(db, events, current_user.id)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return events
+
+
+async def mark_favorite_events(
+    db: AsyncSession, events: list, user_id: int
+) -> list[schemas.EventListView]:
+    """ページのイベントにお気に入り登録済みかどうかを設定する。キャッシュされた結果は変更しない"""
+    events = event_list_adapter.validate_python(events, from_attributes=True)
+    favorite_ids = await event_crud.bookmarked_event_ids_async(
+        db, user_id, [event.id for event in events]
+    )
+    return [
+        event.model_copy(update={"is_favorite": event.id in favorite_ids})
+        for event in events
+    ]
 
 
 @router.get(
@@ -77,24 +123,70 @@ def get_recent_events(db: Session = Depends(get_db)):
     """
     開催3日前で、ステータスが「公開中」のイベントを取得する。
     """
-    return event_crud.get_recent_events(db)
+    return single_flight.do(
+        ("events", "recent"),
+        lambda: event_list_adapter.validate_python(
+            event_crud.get_recent_events(db), from_attributes=True
+        ),
+    )
+
+
+@router.get(
+    "/calendar/",
+    response_model=list[schemas.EventCalendarDay],
+    summary="イベントカレンダー取得",
+)
+def get_event_calendar(
+    # 月末の翌日を計算するため、9999 年は指定できない
+    year: Annotated[int, Query(ge=1, le=9998)],
+    month: Annotated[int, Query(ge=1, le=12)],
+    status: Literal["all", "active", "inactive", "draft"] = "all",
+    db: Session = Depends(get_db),
+):
+    """
+    指定した月の日ごとに、その日と重なる日時があるイベントの数を取得する。
+    """
+    return event_crud.get_event_calendar(db, year, month, status)
 
 
 @router.get("/{event_id}", response_model=schemas.Event, summary="イベント詳細取得")
-def get_event(
+async def get_event(
     event_id: int,
-    current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker = Depends(get_async_sessionmaker),
 ):
     """
     イベントの詳細情報を取得する。
     このエンドポイントにアクセスできるユーザーは、メールアドレスの認証が完了しているユーザーのみである。
     追加のデータで、お気に入り登録しているかどうかを返す。
     """
-    event = event_crud.watch_event(db, event_id, current_user.id)
-    setattr(event, "is_favorite", event in current_user.event_bookmarks)
-    # assert event is None, event.reviews
-    return event
+    # 同時に同じイベントを取得するリクエストは、詳細の読み込みを共有する
+    # 直前に書き込んだユーザーはプライマリから読み込み、レプリカから読み込んだ結果とは共有しない
+    principal = current_user.username
+    primary = write_tracker.recently_wrote(principal)
+    event = await single_flight.do_async(
+        ("events", event_id, "primary" if primary else "replica"),
+        lambda: load_event_detail(
+            session_factory, event_id, principal if primary else None
+        ),
+    )
+    await event_crud.record_watch_async(db, event_id, current_user.id)
+    is_favorite = await event_crud.is_bookmarked_async(db, event_id, current_user.id)
+    return event.model_copy(update={"is_favorite": is_favorite})
+
+
+async def load_event_detail(
+    session_factory: async_sessionmaker, event_id: int, principal: Optional[str] = None
+) -> schemas.Event:
+    # 最初のリクエストが先に終わっても共有する処理が続くよう、リクエストのセッションは使わない
+    async with session_factory() as db:
+        if principal is not None:
+            set_principal(db.sync_session, principal)
+        event = await event_crud.get_event_async(db, event_id)
+        # is_favorite はリクエストしたユーザーごとに設定する
+        setattr(event, "is_favorite", False)
+        return schemas.Event.model_validate(event, from_attributes=True)
 
 
 @router.put("/{event_id}", response_model=schemas.EventCreateResponse, summary="イベント更新")
@@ -269,3 +361,28 @@ def get_event_impressions(
     イベント広告のインプレッションを取得する。
     """
     return event_crud.get_event_impressions(db, event_id)
+
+
+@router.get(
+    "/{event_id}/impressions/daily",
+    response_model=list[schemas.EventDailyImpression],
+    summary="イベント広告の日別インプレッション取得",
+    tags=["広告インプレッション"],
+)
+def get_event_daily_impressions(
+    event_id: int,
+    date_from: Annotated[Optional[date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[date], Query(alias="to")] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_company_user),
+):
+    """
+    イベント広告の日ごとのインプレッションを、日別の集計から取得する。
+
+        - from, to: 期間を指定する。デフォルトは今日までの30日間。期間は366日まで。
+    """
+    date_to = date_to or get_jst_now().date()
+    date_from = date_from or date_to - timedelta(days=29)
+    if not timedelta(0) <= date_to - date_from < timedelta(days=366):
+        raise HTTPException(status_code=400, detail="Invalid date range")
+    return event_crud.get_event_daily_impressions(db, event_id, date_from, date_to)
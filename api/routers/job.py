@@ -1,21 +1,35 @@
+from datetime import date, timedelta
 from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm.session import Session
 
 import api.cruds.job as job_crud
+import api.cruds.listing as listing_crud
 import api.cruds.message as message_crud
 import api.cruds.plan as plan_crud
 import api.cruds.tag as tag_crud
 from api import models, schemas
+from api.db import write_tracker
 from api.dependencies import (
     common_parameters,
     get_admin_user,
     get_company_user,
+    get_async_db,
+    get_async_sessionmaker,
     get_current_active_user,
+    get_current_active_user_async,
     get_db,
     get_general_user,
+    get_optional_user,
 )
+from api.utils import get_jst_now
+from api.utils.routing import set_principal
+from api.utils.singleflight import single_flight
+
+job_list_adapter = TypeAdapter(list[schemas.JobListView])
 
 router = APIRouter(prefix="/jobs", tags=["求人"])
 
@@ -37,22 +51,29 @@ def create_job(
 
 
 @router.get("/", response_model=list[schemas.JobListView], summary="求人一覧取得")
-def get_jobs(
+async def get_jobs(
     common: Annotated[dict, Depends(common_parameters)],
+    response: Response,
     tag: str = "",
+    current_user: Optional[models.User] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     ## 求人の一覧を取得する。
 
         - limit: 取得する求人の最大数を指定する。デフォルトは100。
         - offset: 取得する求人の開始位置を指定する。デフォルトは0。
-        - sort: ソートする項目を指定する。デフォルトはid。
+        - cursor: 前のページのレスポンスヘッダー X-Next-Cursor の値を指定すると、その続きから取得する。
+        - from, to: 指定した場合は、その期間と重なる日時がある求人を取得する。
+        - sort: ソートする項目を指定する。デフォルトはid。relevance を指定すると、キーワードとの関連度順に並べる。
         - order: ソート順を指定する。デフォルトはasc。(現状機能していない)
-        - keyword: キーワードを指定する。指定した場合は、タイトルとタグのどちらかにキーワードが含まれる求人を取得する。
+        - keyword: キーワードを指定する。指定した場合は、名前・説明・住所・タグにキーワードが含まれる求人を取得する。
         - status: ステータスを指定する。デフォルトはall。
         - user_id: ユーザーIDを指定する。
         - target: 絞り込み内容を指定する。user_idを指定しないと無視される。
 
+        ログインしている場合は、お気に入り登録しているかどうか(is_favorite)を返す。
+
 
     ## status:
 
@@ -70,7 +91,32 @@ def get_jobs(
         - favorite: お気に入り登録している求人を取得する。
         - posted: 自分が作成した求人を取得する。
     """
-    return job_crud.get_jobs(**common, tag_name=tag)
+    jobs, next_cursor = await listing_crud.get_listing(
+        "jobs",
+        common,
+        tag,
+        job_list_adapter,
+        lambda: job_crud.get_jobs_async(db, **common, tag_name=tag),
+    )
+    if current_user is not None:
+        jobs = await mark_favorite_jobs(db, jobs, current_user.id)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return jobs
+
+
+async def mark_favorite_jobs(
+    db: AsyncSession, jobs: list, user_id: int
+) -> list[schemas.JobListView]:
+    """ページの求人にお気に入り登録済みかどうかを設定する。キャッシュされた結果は変更しない"""
+    jobs = job_list_adapter.validate_python(jobs, from_attributes=True)
+    favorite_ids = await job_crud.bookmarked_job_ids_async(
+        db, user_id, [job.id for job in jobs]
+    )
+    return [
+        job.model_copy(update={"is_favorite": job.id in favorite_ids})
+        for job in jobs
+    ]
 
 
 @router.get("/recent/", response_model=list[schemas.JobListView], summary="最近の求人取得")
@@ -78,22 +124,69 @@ def get_recent_jobs(db: Session = Depends(get_db)):
     """
     仕事が行われる3日前で、ステータスが「公開中」の求人を取得する。
     """
-    return job_crud.get_recent_jobs(db)
+    return single_flight.do(
+        ("jobs", "recent"),
+        lambda: job_list_adapter.validate_python(
+            job_crud.get_recent_jobs(db), from_attributes=True
+        ),
+    )
+
+
+@router.get(
+    "/calendar/",
+    response_model=list[schemas.JobCalendarDay],
+    summary="求人カレンダー取得",
+)
+def get_job_calendar(
+    # 月末の翌日を計算するため、9999 年は指定できない
+    year: Annotated[int, Query(ge=1, le=9998)],
+    month: Annotated[int, Query(ge=1, le=12)],
+    status: Literal["all", "active", "inactive", "draft"] = "all",
+    db: Session = Depends(get_db),
+):
+    """
+    指定した月の日ごとに、その日と重なる日時がある求人の数を取得する。
+    """
+    return job_crud.get_job_calendar(db, year, month, status)
 
 
 @router.get("/{job_id}", response_model=schemas.Job, summary="求人詳細取得")
-def get_job(
+async def get_job(
     job_id: int,
-    current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker = Depends(get_async_sessionmaker),
 ):
     """
     求人の詳細情報を取得する。
     このエンドポイントにアクセスできるユーザーは、メールアドレスの認証が完了しているユーザーのみである。
     追加のデータで、お気に入り登録しているかどうかを返す。"""
-    job = job_crud.watch_job(db, job_id, current_user.id)
-    setattr(job, "is_favorite", job in current_user.job_bookmarks)
-    return job
+    # 同時に同じ求人を取得するリクエストは、詳細の読み込みを共有する
+    # 直前に書き込んだユーザーはプライマリから読み込み、レプリカから読み込んだ結果とは共有しない
+    principal = current_user.username
+    primary = write_tracker.recently_wrote(principal)
+    job = await single_flight.do_async(
+        ("jobs", job_id, "primary" if primary else "replica"),
+        lambda: load_job_detail(
+            session_factory, job_id, principal if primary else None
+        ),
+    )
+    await job_crud.record_watch_async(db, job_id, current_user.id)
+    is_favorite = await job_crud.is_bookmarked_async(db, job_id, current_user.id)
+    return job.model_copy(update={"is_favorite": is_favorite})
+
+
+async def load_job_detail(
+    session_factory: async_sessionmaker, job_id: int, principal: Optional[str] = None
+) -> schemas.Job:
+    # 最初のリクエストが先に終わっても共有する処理が続くよう、リクエストのセッションは使わない
+    async with session_factory() as db:
+        if principal is not None:
+            set_principal(db.sync_session, principal)
+        job = await job_crud.get_job_async(db, job_id)
+        # is_favorite はリクエストしたユーザーごとに設定する
+        setattr(job, "is_favorite", False)
+        return schemas.Job.model_validate(job, from_attributes=True)
 
 
 @router.put("/{job_id}", response_model=schemas.JobCreateResponse, summary="求人更新")
@@ -364,3 +457,28 @@ def get_job_impressions(
     イベント広告のインプレッションを取得する。
     """
     return job_crud.get_job_impressions(db, job_id)
+
+
+@router.get(
+    "/{job_id}/impressions/daily",
+    response_model=list[schemas.JobDailyImpression],
+    summary="求人広告の日別インプレッション取得",
+    tags=["広告インプレッション"],
+)
+def get_job_daily_impressions(
+    job_id: int,
+    date_from: Annotated[Optional[date], Query(alias="from")] = None,
+    date_to: Annotated[Optional[date], Query(alias="to")] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_company_user),
+):
+    """
+    求人広告の日ごとのインプレッションを、日別の集計から取得する。
+
+        - from, to: 期間を指定する。デフォルトは今日までの30日間。期間は366日まで。
+    """
+    date_to = date_to or get_jst_now().date()
+    date_from = date_from or date_to - timedelta(days=29)
+    if not timedelta(0) <= date_to - date_from < timedelta(days=366):
+        raise HTTPException(status_code=400, detail="Invalid date range")
+    return job_crud.get_job_daily_impressions(db, job_id, date_from, date_to)
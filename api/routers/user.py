@@ -5,12 +5,19 @@ from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, R
 from jinja2 import Template
 from sqlalchemy.orm.session import Session
 
+import api.cruds.dashboard as dashboard_crud
 import api.cruds.user as user_crud
 import api.routers.auth as auth_router
 from api import config, models, schemas
 from api.utils import send_email
 
-from ..dependencies import get_config, get_current_active_user, get_current_user, get_db
+from ..dependencies import (
+    get_company_user,
+    get_config,
+    get_current_active_user,
+    get_current_user,
+    get_db,
+)
 
 router = APIRouter(prefix="/users", tags=["ユーザー"])
 
@@ -170,6 +177,22 @@ def get_job_postings(
         return [job for job in current_user.job_postings if job.status == type]
 
 
+@router.get(
+    "/dashboard", response_model=schemas.CompanyDashboard, summary="投稿の集計取得"
+)
+def get_dashboard(
+    current_user: models.User = Depends(get_company_user),
+    days: Annotated[int, Query(ge=1, le=366)] = dashboard_crud.DASHBOARD_DAYS,
+    db: Session = Depends(get_db),
+):
+    """
+    自分が作成した求人・イベントごとと全体の、閲覧数・閲覧したユーザー数(推定値)・お気に入り登録数・
+    レビュー数・レビュー平均ポイント・応募のステータスごとの件数を取得する。
+    閲覧したユーザー数は、今日までの days 日間(デフォルトは30日間、366日まで)のものを推定する。
+    """
+    return dashboard_crud.get_company_dashboard(db, current_user.id, days)
+
+
 @router.get(
     "/job-applications", response_model=list[schemas.JobApplication], summary="応募一覧取得"
 )
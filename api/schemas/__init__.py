@@ -1,3 +1,4 @@
+from .dashboard import *
 from .event import *
 from .job import *
 from .message import *
@@ -0,0 +1,36 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class DashboardStats(BaseModel):
+    views: int = Field(..., example=120, description="閲覧数")
+    unique_viewers: Optional[int] = Field(
+        None,
+        example=80,
+        description="期間内に閲覧したユーザー数(推定値)。記録していない場合は null",
+    )
+    bookmarks: int = Field(..., example=5, description="お気に入り登録数")
+    reviews: int = Field(..., example=3, description="レビュー数")
+    average_review_point: Optional[float] = Field(
+        None, example=4.5, description="レビュー平均ポイント"
+    )
+    applications: Dict[str, int] = Field(
+        {}, example={"p": 2, "a": 1}, description="応募のステータスごとの件数"
+    )
+
+
+class DashboardPosting(DashboardStats):
+    id: int = Field(..., example=1, description="投稿ID")
+    name: Optional[str] = Field(None, example="テスト求人", description="名前")
+    status: Optional[str] = Field(None, example="1", description="ステータス")
+
+
+class DashboardSummary(BaseModel):
+    postings: List[DashboardPosting]
+    total: DashboardStats
+
+
+class CompanyDashboard(BaseModel):
+    jobs: DashboardSummary
+    events: DashboardSummary
@@ -1,12 +1,12 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 
-from pydantic import BaseModel, Field, field_serializer
+from pydantic import BaseModel, Field, field_serializer, model_validator
 
 import api.schemas.plan as plan_schema
 import api.schemas.tag as tag_schema
 import api.schemas.user as user_schema
-from api.utils import get_jst_now
+from api.utils import MAX_SLOT_DURATION, get_jst_now
 
 sample_date = get_jst_now() + timedelta(days=1)
 start_time = sample_date.strftime("%Y-%m-%d %H:%M:%S")
@@ -19,7 +19,14 @@ class JobTimeBase(BaseModel):
 
 
 class JobTimeCreate(JobTimeBase):
-    pass
+    @model_validator(mode="after")
+    def check_duration(self):
+        # 期間の重なりの検索で開始日時の範囲を絞り込むため、長さに上限を設ける
+        if self.end_time - self.start_time > MAX_SLOT_DURATION:
+            raise ValueError(
+                f"日時の長さは{MAX_SLOT_DURATION.days}日以内で指定してください"
+            )
+        return self
 
 
 class JobTime(JobTimeBase):
@@ -151,6 +158,14 @@ class JobListView(JobCreate):
     status: Optional[str] = Field(..., example="1", description="イベントステータス")
     job_times: List[JobTime]
     tags: Optional[List[tag_schema.Tag]]
+    next_start_time: Optional[datetime] = Field(
+        None, example=start_time, description="次の仕事の開始日時"
+    )
+    is_favorite: Optional[bool] = Field(
+        None,
+        example=True,
+        description="お気に入り登録済みかどうか。ログインしていない場合は null",
+    )
 
 
 class Job(JobListView):
@@ -183,3 +198,16 @@ class JobApplication(JobApplicationBase):
 class JobApplicationUsers(BaseModel):
     job_id: int
     users: List[JobApplicationBase]
+
+
+class JobCalendarDay(BaseModel):
+    day: date = Field(..., example="2024-01-11", description="日付")
+    count: int = Field(..., example=3, description="その日に日時がある求人の数")
+
+
+class JobDailyImpression(BaseModel):
+    day: date = Field(..., example="2024-01-11", description="日付")
+    views: int = Field(..., example=120, description="閲覧数")
+    unique_viewers: int = Field(..., example=80, description="閲覧したユーザー数")
+    bookmarks: int = Field(..., example=5, description="お気に入り登録数")
+    applications: int = Field(..., example=1, description="応募数")
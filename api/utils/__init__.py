@@ -1,7 +1,8 @@
-from .common import get_jst_now
+from .common import MAX_SLOT_DURATION, get_jst_now
 from .email import send_email
 
 __all__ = [
+    "MAX_SLOT_DURATION",
     "get_jst_now",
     "send_email",
 ]
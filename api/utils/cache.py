@@ -0,0 +1,134 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+SESSION_TAGS_KEY = "result_cache_tags"
+
+
+class ResultCache:
+    """
+    TTL と LRU で管理する、プロセス内の結果キャッシュ。
+
+    エントリには依存するタグを付けておき、書き込み時にタグ単位で無効化する。
+    無効化と同時に実行されていた読み込みの結果を保存しないよう、
+    読み込み前に stamp() を取得し、set() に渡す。
+    """
+
+    def __init__(self, ttl: Optional[float], maxsize: int = 1000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, Any, frozenset]] = (
+            OrderedDict()
+        )
+        self._keys_by_tag: dict[Hashable, set] = {}
+        self._counter = itertools.count(1)
+        self._stamp = 0
+        # タグごとの最後に無効化された時点。増えすぎた場合は floor にまとめる
+        self._invalidated: dict[Hashable, int] = {}
+        self._floor = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl is not None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def stamp(self) -> int:
+        with self._lock:
+            return self._stamp
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[Hashable], stamp: int):
+        """stamp を取得した後にタグが無効化されていた場合は保存しない"""
+        if not self.enabled:
+            return
+        tags = frozenset(tags)
+        with self._lock:
+            if stamp < self._floor or any(
+                self._invalidated.get(tag, 0) > stamp for tag in tags
+            ):
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[Hashable]):
+        with self._lock:
+            self._stamp = next(self._counter)
+            for tag in tags:
+                self._invalidated[tag] = self._stamp
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+            if len(self._invalidated) > self.maxsize * 4:
+                self._invalidated.clear()
+                self._floor = self._stamp
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._stamp = next(self._counter)
+            self._invalidated.clear()
+            self._floor = self._stamp
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+def invalidate_on_commit(cache: ResultCache, tags_for: Callable[[Any], set]):
+    """
+    flush された行から tags_for で無効化するタグを集め、コミット後に無効化する。
+    ロールバックされた場合は破棄する。
+    """
+    # 複数のキャッシュを登録できるよう、セッションに保存するタグはキャッシュごとに分ける
+    key = (SESSION_TAGS_KEY, id(cache))
+
+    def after_flush(session: Session, flush_context):
+        tags = session.info.setdefault(key, set())
+        for obj in session.new:
+            tags |= tags_for(obj)
+        for obj in session.deleted:
+            tags |= tags_for(obj)
+        for obj in session.dirty:
+            if session.is_modified(obj):
+                tags |= tags_for(obj)
+
+    def after_commit(session: Session):
+        tags = session.info.pop(key, None)
+        if tags:
+            cache.invalidate(tags)
+
+    def after_rollback(session: Session):
+        session.info.pop(key, None)
+
+    event.listen(Session, "after_flush", after_flush)
+    event.listen(Session, "after_commit", after_commit)
+    event.listen(Session, "after_rollback", after_rollback)
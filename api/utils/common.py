@@ -1,5 +1,9 @@
 from datetime import datetime, timedelta
 
+# 求人・イベントの 1 つの日時の長さの上限
+# 期間の重なりを検索するとき、開始日時の範囲をこの長さで絞り込む
+MAX_SLOT_DURATION = timedelta(days=31)
+
 
 def get_jst_now():
     return datetime.utcnow() + timedelta(hours=9)
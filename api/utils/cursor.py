@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import ColumnElement, Select
+
+
+class SortKey(NamedTuple):
+    """一覧の並び替えに使用する値。同じ値の行は id で並べる。"""
+
+    expr: ColumnElement
+    descending: bool = True
+
+
+def encode_cursor(sort: str, value: Any, id: int) -> str:
+    """並び替えの値と id から、次のページを取得するためのカーソル文字列を作成する"""
+    if isinstance(value, datetime):
+        value = {"datetime": value.isoformat()}
+    elif isinstance(value, Decimal):
+        value = float(value)
+    payload = json.dumps([sort, value, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple[Any, int]:
+    """カーソル文字列から並び替えの値と id を取り出す。不正な場合は 400 を返す"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["datetime"])
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort")
+    return value, id
+
+
+def order_by_sort_key(stmt: Select, key: SortKey, id_column) -> Select:
+    """並び替えの値が同じ行も順序が一意に決まるよう、id を第 2 キーにして並べる"""
+    if key.descending:
+        return stmt.order_by(key.expr.desc(), id_column.desc())
+    return stmt.order_by(key.expr, id_column)
+
+
+def seek(
+    stmt: Select, key: SortKey, id_column, sort: str, cursor: Optional[str]
+) -> Select:
+    """カーソルの位置より後ろの行だけを取得するよう、(並び替えの値, id) で範囲を絞り込む"""
+    if not cursor:
+        return stmt
+    value, id = decode_cursor(cursor, sort)
+    if key.descending:
+        condition = or_(key.expr < value, and_(key.expr == value, id_column < id))
+    else:
+        condition = or_(key.expr > value, and_(key.expr == value, id_column > id))
+    return stmt.filter(condition)
@@ -0,0 +1,91 @@
+import hashlib
+import math
+import threading
+from typing import Hashable, Optional
+
+DEFAULT_PRECISION = 11
+
+
+class HyperLogLog:
+    """
+    重複を除いた要素数を、固定サイズ(2 ** precision バイト)のレジスタで推定する。
+    precision が 11 の場合、標準誤差は約 2.3%。同じ precision 同士であれば合併できる
+    """
+
+    def __init__(
+        self, precision: int = DEFAULT_PRECISION, registers: Optional[bytes] = None
+    ):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers or self.size)
+        if len(self.registers) != self.size:
+            raise ValueError("register size does not match the precision")
+
+    @classmethod
+    def from_bytes(cls, registers: bytes) -> "HyperLogLog":
+        return cls(len(registers).bit_length() - 1, registers)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    def add(self, value: Hashable):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size**2 / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        # 要素数が少ない場合は、空のレジスタの数から推定する
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+
+class SketchBuffer:
+    """
+    キーごとの HyperLogLog をプロセス内で更新し、定期的にまとめて書き込むためのバッファ。
+    メモリ使用量はキーの数 × 2 ** precision バイトに抑えられる
+    """
+
+    def __init__(self, interval: Optional[float], precision: int = DEFAULT_PRECISION):
+        self.interval = interval
+        self.precision = precision
+        self._lock = threading.Lock()
+        self._sketches: dict[Hashable, HyperLogLog] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval is not None
+
+    def add(self, key: Hashable, value: Hashable):
+        with self._lock:
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = self._sketches[key] = HyperLogLog(self.precision)
+            sketch.add(value)
+
+    def drain(self) -> dict[Hashable, HyperLogLog]:
+        with self._lock:
+            sketches, self._sketches = self._sketches, {}
+        return sketches
+
+    def restore(self, sketches: dict[Hashable, HyperLogLog]):
+        """書き込みに失敗したスケッチをバッファに戻す"""
+        with self._lock:
+            for key, sketch in sketches.items():
+                current = self._sketches.get(key)
+                if current is None:
+                    self._sketches[key] = sketch
+                else:
+                    current.merge(sketch)
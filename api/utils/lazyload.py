@@ -0,0 +1,67 @@
+import logging
+import threading
+from collections import deque
+from typing import Literal
+
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from api.utils.query_stats import current_route
+
+logger = logging.getLogger("api.lazyload")
+
+LazyLoadMode = Literal["off", "warn", "raise"]
+
+
+class LazyLoadError(Exception):
+    def __init__(self, relationship: str, route: str = None):
+        self.relationship = relationship
+        self.route = route
+        super().__init__(f"Lazy load of {relationship} (route: {route})")
+
+
+class LazyLoadDetector:
+    """
+    SQLを発行する遅延読み込み(N+1の原因)を検出する。
+
+    - warn: ログに出力し、records に記録する。
+    - raise: LazyLoadError を送出する。
+    - off: 何もしない。
+    """
+
+    def __init__(self, mode: LazyLoadMode = "off", maxlen: int = 1000):
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.records: deque[dict] = deque(maxlen=maxlen)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def enable(self, mode: LazyLoadMode = "warn"):
+        self.mode = mode
+        if not event.contains(Session, "do_orm_execute", self._on_execute):
+            event.listen(Session, "do_orm_execute", self._on_execute)
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+
+    def _on_execute(self, orm_execute_state: ORMExecuteState):
+        # UPDATE・DELETE 文にはローダーの情報がない
+        if (
+            not self.enabled
+            or not orm_execute_state.is_select
+            or orm_execute_state.lazy_loaded_from is None
+        ):
+            return
+        relationship = str(orm_execute_state.loader_strategy_path[-1])
+        route = current_route()
+        if self.mode == "raise":
+            raise LazyLoadError(relationship, route)
+        logger.warning("Lazy load of %s (route: %s)", relationship, route)
+        with self._lock:
+            self.records.append({"relationship": relationship, "route": route})
+
+
+lazy_load_detector = LazyLoadDetector()
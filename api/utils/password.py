@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordPoolBusy(Exception):
+    """待ちの件数が上限に達し、ハッシュ化・検証を受け付けられない"""
+
+
+class PasswordPool:
+    """
+    bcrypt のハッシュ化・検証を、リクエストのスレッドプールとは別の executor で実行する。
+    受け付ける件数を workers + max_queue までに制限し、超えた分は待たせずに PasswordPoolBusy を送出する。
+    processes を指定した場合は、GIL の影響を受けないプロセスプールで実行する
+    """
+
+    def __init__(self, workers: int, max_queue: int, processes: bool = False):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.processes = processes
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        # プロセスの起動を import 時に行わないよう、最初の利用時に作成する
+        with self._lock:
+            if self._executor is None:
+                if self.processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="password"
+                    )
+            return self._executor
+
+    def submit(self, fn: Callable, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password: str) -> str:
+        return self.submit(hash_password, password).result()
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self.submit(verify_password, password, hashed_password).result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(hash_password, password))
+
+    async def verify_async(self, password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(
+            self.submit(verify_password, password, hashed_password)
+        )
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,88 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# 接続取得の待ち時間ヒストグラムの境界(ミリ秒)
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolStats:
+    """コネクションプールからの接続取得の待ち時間を集計する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.timeouts = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+            self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def observe(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            self.count += 1
+            self.total_ms += wait_ms
+            self.max_ms = max(self.max_ms, wait_ms)
+            self.buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            labels = [str(le) for le in WAIT_BUCKETS_MS] + ["+Inf"]
+            return {
+                "count": self.count,
+                "timeouts": self.timeouts,
+                "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+                "max_ms": round(self.max_ms, 3),
+                "histogram_ms": dict(zip(labels, self.buckets)),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """接続取得にかかった時間を PoolStats に記録する QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - start) * 1000
+            self.stats.observe(wait_ms, timed_out)
+
+    def recreate(self):
+        # dispose() 後もプールの統計は引き継ぐ
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """非同期エンジン用の InstrumentedQueuePool"""
+
+
+def get_pool_status(pool: InstrumentedQueuePool) -> dict:
+    """プールの現在の状態と、接続取得の待ち時間の統計を返す"""
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+        "wait": pool.stats.to_dict(),
+    }
@@ -0,0 +1,118 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger("api.sql")
+
+
+class RequestQueryStats:
+    """1リクエスト中に発行されたSQLの件数と実行時間を集計する"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    @property
+    def route(self) -> str:
+        # ルーティング後は scope にマッチしたルートが設定される
+        route = self.scope.get("route")
+        return getattr(route, "path_format", None) or self.scope.get("path", "")
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms >= self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+
+    def server_timing(self) -> str:
+        return f'db;desc="{self.count} queries";dur={self.total_ms:.1f}'
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.scope.get("method"),
+            "route": self.route,
+            "query_count": self.count,
+            "db_time_ms": round(self.total_ms, 3),
+            "slowest_ms": round(self.slowest_ms, 3),
+            "slowest_statement": self.slowest_statement,
+        }
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    """実行中のリクエストの集計を返す。リクエスト外では None"""
+    return _current_stats.get()
+
+
+def current_route() -> Optional[str]:
+    stats = current_stats()
+    return stats.route if stats is not None else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is None or context is None:
+        return
+    # 失敗した文の開始時刻が残らないよう、接続ではなく文の実行ごとのコンテキストに保存する
+    context._query_stats_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    start = getattr(context, "_query_stats_start", None)
+    if stats is None or start is None:
+        return
+    stats.record(statement, (time.perf_counter() - start) * 1000)
+
+
+def instrument_engine(engine: Engine):
+    """エンジンにSQLの計測用のイベントを登録する"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """
+    リクエストごとのSQLの件数と実行時間を Server-Timing ヘッダーで返し、ログに出力する。
+    report=False の場合は、集計とルートの記録(スロークエリログ用)だけを行う。
+    BaseHTTPMiddleware を経由しない ASGI ミドルウェアとして実装している。
+    """
+
+    def __init__(self, app, report: bool = True):
+        self.app = app
+        self.report = report
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats(scope)
+        token = _current_stats.set(stats)
+
+        async def send_with_server_timing(message):
+            if self.report and message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            _current_stats.reset(token)
+            if self.report:
+                logger.info(json.dumps(stats.to_dict(), ensure_ascii=False))
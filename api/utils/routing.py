@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+from typing import Hashable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.sql.dml import UpdateBase
+
+
+class WriteTracker:
+    """
+    書き込みを行ったユーザーと時刻を記録する。
+    書き込みから window 秒の間は、そのユーザーの読み込みをプライマリに送る。
+    """
+
+    def __init__(self, window: float, maxsize: int = 10000):
+        self.window = window
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._writes: dict[Hashable, float] = {}
+
+    def mark(self, key: Hashable):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._writes) >= self.maxsize:
+                self._writes = {
+                    k: t for k, t in self._writes.items() if now - t < self.window
+                }
+            self._writes[key] = now
+
+    def recently_wrote(self, key: Hashable) -> bool:
+        with self._lock:
+            written_at = self._writes.get(key)
+        return written_at is not None and time.monotonic() - written_at < self.window
+
+
+class RoutingSession(Session):
+    """
+    読み込みをレプリカ、書き込みをプライマリ(bind)に振り分けるセッション。
+
+    - INSERT/UPDATE/DELETE と SELECT ... FOR UPDATE はプライマリに送る。
+    - 一度書き込んだセッションは、以降の読み込みもプライマリに送る。
+    - info["principal"] に設定したユーザーが最近書き込んでいる場合もプライマリに送る。
+    """
+
+    def __init__(
+        self,
+        *args,
+        replicas: list[Engine] = (),
+        tracker: Optional[WriteTracker] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.replicas = list(replicas)
+        self.tracker = tracker
+        # 同一セッション内では同じレプリカを使い、読み込み結果を一貫させる
+        self.replica = random.choice(self.replicas) if self.replicas else None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.replica is None or self._use_primary(clause):
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        return self.replica
+
+    def _use_primary(self, clause) -> bool:
+        if self._flushing or self.info.get("wrote"):
+            return True
+        if isinstance(clause, UpdateBase):
+            return True
+        if getattr(clause, "_for_update_arg", None) is not None:
+            return True
+        principal = self.info.get("principal")
+        return (
+            principal is not None
+            and self.tracker is not None
+            and self.tracker.recently_wrote(principal)
+        )
+
+
+def set_principal(db: Session, key: Hashable):
+    """セッションを使用しているユーザーを設定する(read-your-writes の判定に使用)"""
+    db.info["principal"] = key
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_dml(orm_execute_state: ORMExecuteState):
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_flush(session: RoutingSession, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _track_commit(session: RoutingSession):
+    principal = session.info.get("principal")
+    if session.info.get("wrote") and principal is not None and session.tracker:
+        session.tracker.mark(principal)
@@ -0,0 +1,51 @@
+import unicodedata
+from collections import Counter
+from typing import Iterable, Optional
+
+# カタカナ(ァ-ヶ)をひらがな(ぁ-ゖ)に変換する表
+KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+
+def normalize(text: Optional[str]) -> str:
+    """
+    表記揺れを吸収した検索用の文字列を返す。
+    NFKC で全角英数字・半角カナを揃え、カタカナをひらがなに、英字を小文字にする。
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return text.translate(KATAKANA_TO_HIRAGANA)
+
+
+def ngrams(text: Optional[str]) -> list[str]:
+    """
+    正規化した文字列を空白で区切り、それぞれを 2 文字ずつの N-gram に分割する。
+    1 文字のキーワードでも前方一致で検索できるよう、語の末尾の 1 文字も含める。
+    """
+    grams = []
+    for word in normalize(text).split():
+        grams.extend(word[i : i + 2] for i in range(len(word)))
+    return grams
+
+
+def gram_weights(fields: Iterable[tuple[Optional[str], int]]) -> Counter:
+    """(文字列, 重み) の組から、N-gram ごとの重みの合計を求める"""
+    weights = Counter()
+    for text, weight in fields:
+        for gram in ngrams(text):
+            weights[gram] += weight
+    return weights
+
+
+def keyword_grams(keyword: str) -> list[str]:
+    """
+    検索キーワードのうち、すべて含まれている必要がある N-gram を返す。
+    2 文字以上の語は語末の 1 文字を除く。1 文字の語はその 1 文字で前方一致させる。
+    """
+    grams = []
+    for word in normalize(keyword).split():
+        if len(word) == 1:
+            grams.append(word)
+        else:
+            grams.extend(word[i : i + 2] for i in range(len(word) - 1))
+    return list(dict.fromkeys(grams))
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中の場合は新たに実行せず、実行中の処理の結果を共有する。
+    結果は複数のリクエストで共有されるため、呼び出し側で変更してはならない。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._tasks: dict[tuple, asyncio.Task] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """スレッドプールで実行される同期のエンドポイント用"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        async のエンドポイント用。
+        最初の呼び出し元がキャンセルされても、待っている呼び出し元のために処理は続ける。
+        """
+        # Task はイベントループごとに分ける
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self._forget(task_key))
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key: tuple):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+
+single_flight = SingleFlight()
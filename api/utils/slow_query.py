@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api.utils.common import get_jst_now
+from api.utils.query_stats import current_route
+
+# EXPLAIN の構文はDBごとに異なる
+EXPLAIN_PREFIX = {
+    "mysql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+MAX_PARAMETER_LENGTH = 200
+
+
+class SlowQueryLog:
+    """
+    実行時間が閾値を超えたSQLを、バインドパラメーター・発行元のルート・実行計画とともに記録する。
+    記録は最新の maxlen 件だけを保持する。
+    """
+
+    def __init__(self, threshold_ms: float, maxlen: int = 100):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._entries: deque[dict] = deque(maxlen=maxlen)
+
+    def instrument(self, engine: Engine):
+        if not event.contains(engine, "before_cursor_execute", self._before):
+            event.listen(engine, "before_cursor_execute", self._before)
+            event.listen(engine, "after_cursor_execute", self._after)
+
+    def entries(self) -> list[dict]:
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if context is None:
+            return
+        # 失敗した文の開始時刻が残らないよう、文の実行ごとのコンテキストに保存する
+        context._slow_query_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_slow_query_start", None)
+        if start is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+        entry = {
+            "recorded_at": get_jst_now(),
+            "duration_ms": round(elapsed_ms, 3),
+            "route": current_route(),
+            "statement": statement,
+            "parameters": _format_parameters(parameters),
+            "explain": None,
+        }
+        if not executemany and statement.lstrip()[:6].upper() == "SELECT":
+            entry["explain"] = _explain(conn, statement, parameters)
+        with self._lock:
+            self._entries.append(entry)
+
+
+def _format_parameters(parameters) -> Optional[list[str]]:
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        parameters = parameters.values()
+    return [repr(value)[:MAX_PARAMETER_LENGTH] for value in parameters]
+
+
+def _explain(conn, statement: str, parameters) -> list[list[str]]:
+    prefix = EXPLAIN_PREFIX.get(conn.dialect.name, "EXPLAIN ")
+    # SQLAlchemy のイベントを経由しないよう、DBAPI のカーソルで直接実行する
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [[str(value) for value in row] for row in cursor.fetchall()]
+    except Exception as e:
+        return [[f"EXPLAIN failed: {e}"]]
+    finally:
+        cursor.close()
@@ -0,0 +1,46 @@
+import threading
+from datetime import datetime
+from typing import Hashable, Optional
+
+
+class ViewBuffer:
+    """
+    閲覧の記録をプロセス内で集約し、まとめて書き込むためのバッファ。
+    キーごとに閲覧回数と最後に閲覧した日時を保持する。
+    """
+
+    def __init__(self, interval: Optional[float]):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._views: dict[Hashable, tuple[int, datetime]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval is not None
+
+    def add(self, key: Hashable, at: datetime, count: int = 1):
+        with self._lock:
+            self._merge(key, count, at)
+
+    def drain(self) -> dict[Hashable, tuple[int, datetime]]:
+        """集約した閲覧を取り出し、バッファを空にする"""
+        with self._lock:
+            views, self._views = self._views, {}
+        return views
+
+    def restore(self, views: dict[Hashable, tuple[int, datetime]]):
+        """書き込みに失敗した閲覧をバッファに戻す"""
+        with self._lock:
+            for key, (count, at) in views.items():
+                self._merge(key, count, at)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._views)
+
+    def _merge(self, key: Hashable, count: int, at: datetime):
+        current = self._views.get(key)
+        if current is not None:
+            count += current[0]
+            at = max(at, current[1])
+        self._views[key] = (count, at)
@@ -0,0 +1,109 @@
+"""
+求人一覧の取得で発行されるSQLの件数と処理時間を、ローダーオプションの有無で比較する。
+
+10,000件の求人(各2件の日時・2件のタグ)を投入したSQLiteに対して、
+一覧取得から JobListView へのシリアライズまでを計測する。
+
+    $ python -m benchmarks.eager_loading
+"""
+
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+import api.cruds.job as job_crud
+from api import models, schemas
+from api.db import Base
+
+JOB_COUNT = 10_000
+TAG_COUNT = 50
+LIMITS = (10, 100, 1000)
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    now = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.Tag), [{"name": f"tag{i}"} for i in range(TAG_COUNT)]
+        )
+        conn.execute(
+            insert(models.Job),
+            [
+                {
+                    "name": f"job{i}",
+                    "salary": "時給1000円",
+                    "postal_code": "782-8502",
+                    "prefecture": "高知県",
+                    "city": "香美市",
+                    "address": "土佐山田町宮ノ口185",
+                    "description": "説明",
+                    "is_one_day": True,
+                    "status": "active",
+                }
+                for i in range(JOB_COUNT)
+            ],
+        )
+        conn.execute(
+            insert(models.JobTime),
+            [
+                {
+                    "job_id": job_id,
+                    "start_time": now + timedelta(hours=job_id + i),
+                    "end_time": now + timedelta(hours=job_id + i + 1),
+                }
+                for job_id in range(1, JOB_COUNT + 1)
+                for i in range(2)
+            ],
+        )
+        conn.execute(
+            insert(models.JobTag),
+            [
+                {"job_id": job_id, "tag_id": tag_id}
+                for job_id in range(1, JOB_COUNT + 1)
+                for tag_id in random.sample(range(1, TAG_COUNT + 1), 2)
+            ],
+        )
+
+
+def measure(Session, engine, limit: int, eager: bool) -> tuple[int, float]:
+    queries = []
+
+    def count(*args):
+        queries.append(1)
+
+    event.listen(engine, "after_cursor_execute", count)
+    start = time.perf_counter()
+    with Session() as db:
+        if eager:
+            jobs = job_crud.get_jobs(db, limit=limit)
+        else:
+            stmt = job_crud.get_jobs_statement().limit(limit)
+            jobs = db.scalars(stmt).all()
+        [schemas.JobListView.model_validate(job, from_attributes=True) for job in jobs]
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "after_cursor_execute", count)
+    return len(queries), elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        seed(engine)
+        Session = sessionmaker(bind=engine)
+        print(f"jobs={JOB_COUNT}")
+        print(f"{'limit':>6} {'mode':>6} {'queries':>8} {'ms':>10}")
+        for limit in LIMITS:
+            for eager in (False, True):
+                queries, elapsed = measure(Session, engine, limit, eager)
+                mode = "eager" if eager else "lazy"
+                print(f"{limit:>6} {mode:>6} {queries:>8} {elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+一覧の取得と同時にログインを繰り返したときの、ログインのスループットと一覧の応答時間を計測する。
+
+起動中のサーバーに対して実行する。接続先は BENCH_URL、ログインするユーザーは
+BENCH_USERNAME と BENCH_PASSWORD で指定する(未設定の場合は admin と ADMIN_PASSWORD)。
+ワーカーの数を変えて比較する場合は、PASSWORD_HASH_WORKERS などを変えてサーバーを起動し直す。
+
+    $ BENCH_URL=http://localhost:8000/api/v1 python -m benchmarks.login_load
+"""
+
+import os
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+LOGIN_THREADS = 32
+LISTING_THREADS = 8
+DURATION = 10.0
+
+
+def run(url: str, path: str, request, stop: threading.Event):
+    """stop が設定されるまでリクエストを繰り返し、(ステータスコード, 秒数) の一覧を返す"""
+    results = []
+    with httpx.Client(base_url=url, timeout=30) as client:
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = request(client, path).status_code
+            results.append((status, time.perf_counter() - start))
+    return results
+
+
+def login(username: str, password: str):
+    def request(client: httpx.Client, path: str):
+        return client.post(path, data={"username": username, "password": password})
+
+    return request
+
+
+def listing(client: httpx.Client, path: str):
+    return client.get(path, params={"limit": 20})
+
+
+def report(name: str, results: list, elapsed: float):
+    statuses = Counter(status for status, _ in results)
+    ok = sorted(seconds for status, seconds in results if status == 200)
+    line = f"{name:>8} ok/s={len(ok) / elapsed:>8.1f} statuses={dict(statuses)}"
+    if len(ok) >= 2:
+        quantiles = statistics.quantiles(ok, n=100)
+        line += f" p50={quantiles[49] * 1000:.1f}ms p95={quantiles[94] * 1000:.1f}ms"
+    print(line)
+
+
+def main():
+    url = os.getenv("BENCH_URL", "http://localhost:8000/api/v1")
+    username = os.getenv("BENCH_USERNAME", "admin")
+    password = os.getenv("BENCH_PASSWORD", os.getenv("ADMIN_PASSWORD", ""))
+    stop = threading.Event()
+    print(f"login threads={LOGIN_THREADS} listing threads={LISTING_THREADS}")
+    with ThreadPoolExecutor(max_workers=LOGIN_THREADS + LISTING_THREADS) as pool:
+        start = time.perf_counter()
+        logins = [
+            pool.submit(run, url, "/auth/token", login(username, password), stop)
+            for _ in range(LOGIN_THREADS)
+        ]
+        listings = [
+            pool.submit(run, url, "/jobs/", listing, stop)
+            for _ in range(LISTING_THREADS)
+        ]
+        time.sleep(DURATION)
+        stop.set()
+        login_results = [r for future in logins for r in future.result()]
+        listing_results = [r for future in listings for r in future.result()]
+        elapsed = time.perf_counter() - start
+    report("login", login_results, elapsed)
+    report("listing", listing_results, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+1件の求人に閲覧数を同時に加算したときのスループットを、シャードの数ごとに比較する。
+
+行ロックの競合を再現するため、MySQL に対して実行する(SQLite はデータベース全体をロックするため比較にならない)。
+テーブルの作成と行の追加・削除を行うため、接続先はアプリケーションとは別のデータベースを BENCH_DB_URL で指定する。
+
+    $ BENCH_DB_URL=mysql+pymysql://root:@localhost:3306/bench python -m benchmarks.view_shards
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.orm import sessionmaker
+
+import api.cruds.watch as watch_crud
+from api import models
+from api.db import Base
+
+THREADS = 16
+INCREMENTS_PER_THREAD = 200
+SHARD_COUNTS = (1, 2, 4, 8, 16)
+
+
+def seed(engine) -> int:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        return conn.execute(
+            insert(models.Job).values(name="bench")
+        ).inserted_primary_key[0]
+
+
+def measure(Session, job_id: int, shards: int) -> float:
+    with Session() as db:
+        db.execute(
+            delete(models.JobViewShard).where(models.JobViewShard.job_id == job_id)
+        )
+        watch_crud.create_shards(
+            db,
+            models.JobViewShard,
+            models.Job,
+            "job_id",
+            shards,
+            models.Job.id == job_id,
+        )
+        db.commit()
+
+    def work():
+        with Session() as db:
+            for _ in range(INCREMENTS_PER_THREAD):
+                db.execute(
+                    watch_crud.shard_increment(
+                        models.JobViewShard, "job_id", job_id, 1, shards
+                    )
+                )
+                db.commit()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        for future in [pool.submit(work) for _ in range(THREADS)]:
+            future.result()
+    return time.perf_counter() - start
+
+
+def main():
+    bench_db_url = os.getenv("BENCH_DB_URL")
+    if not bench_db_url:
+        raise SystemExit("BENCH_DB_URL を指定してください")
+    engine = create_engine(bench_db_url, pool_size=THREADS, max_overflow=0)
+    job_id = seed(engine)
+    Session = sessionmaker(bind=engine)
+    total = THREADS * INCREMENTS_PER_THREAD
+    print(f"threads={THREADS} increments={total}")
+    print(f"{'shards':>6} {'ms':>10} {'per sec':>10}")
+    try:
+        for shards in SHARD_COUNTS:
+            elapsed = measure(Session, job_id, shards)
+            print(f"{shards:>6} {elapsed * 1000:>10.1f} {total / elapsed:>10.0f}")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(models.Job).where(models.Job.id == job_id))
+
+
+if __name__ == "__main__":
+    main()
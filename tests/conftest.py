@@ -5,17 +5,33 @@ from fastapi.testclient import TestClient
 from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
 from api.db import Base
-from api.dependencies import get_config, get_current_user, get_db, get_test_config
+from api.dependencies import (
+    get_async_db,
+    get_async_sessionmaker,
+    get_config,
+    get_current_user,
+    get_current_user_async,
+    get_db,
+    get_optional_user,
+    get_test_config,
+)
 from api.main import create_app
 from api.models import User
+from api.utils.lazyload import lazy_load_detector
 
-TEST_DB_URL = "sqlite:///:memory:"
+# 同期・非同期の両エンジンから同じデータを参照するため、ファイルのSQLiteを使用する
+TEST_DB_URL = "sqlite:///{path}"
+TEST_ASYNC_DB_URL = "sqlite+aiosqlite:///{path}"
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# テスト中の遅延読み込みを記録し、lazy_loads フィクスチャで検査できるようにする
+lazy_load_detector.enable("warn")
+
 
 class MockBaseUser(BaseModel):
     id: int = 2
@@ -48,10 +64,21 @@ def api_path():
     return "/api/v1"
 
 
+@pytest.fixture
+def lazy_loads():
+    lazy_load_detector.reset()
+    yield lazy_load_detector.records
+
+
 @pytest.fixture(scope="class")
-def db_session():
+def db_path(tmp_path_factory):
+    return tmp_path_factory.mktemp("db") / "test.db"
+
+
+@pytest.fixture(scope="class")
+def db_session(db_path):
     engine = create_engine(
-        TEST_DB_URL,
+        TEST_DB_URL.format(path=db_path),
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
     )
@@ -74,37 +101,69 @@ def db_session():
     session.close()
 
 
+@pytest.fixture(scope="class")
+def async_session_factory(db_path, db_session):
+    # TestClientごとにイベントループが変わるため、接続はプールしない
+    engine = create_async_engine(
+        TEST_ASYNC_DB_URL.format(path=db_path), poolclass=NullPool
+    )
+    return async_sessionmaker(
+        autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+    )
+
+
+@pytest.fixture(scope="class")
+def async_db(async_session_factory):
+    async def override():
+        async with async_session_factory() as db:
+            yield db
+
+    return override
+
+
 @pytest.fixture
-def general_client(db_session):
+def general_client(db_session, async_db, async_session_factory):
     app = create_app()
 
     app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_async_db] = async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: async_session_factory
     app.dependency_overrides[get_config] = get_test_config
     app.dependency_overrides[get_current_user] = MockGeneralUser
+    app.dependency_overrides[get_current_user_async] = MockGeneralUser
+    app.dependency_overrides[get_optional_user] = MockGeneralUser
 
     with TestClient(app) as client:
         yield client
 
 
 @pytest.fixture
-def company_client(db_session):
+def company_client(db_session, async_db, async_session_factory):
     app = create_app()
 
     app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_async_db] = async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: async_session_factory
     app.dependency_overrides[get_config] = get_test_config
     app.dependency_overrides[get_current_user] = MockCompanyUser
+    app.dependency_overrides[get_current_user_async] = MockCompanyUser
+    app.dependency_overrides[get_optional_user] = MockCompanyUser
 
     with TestClient(app) as client:
         yield client
 
 
 @pytest.fixture
-def admin_client(db_session):
+def admin_client(db_session, async_db, async_session_factory):
     app = create_app()
 
     app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_async_db] = async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: async_session_factory
     app.dependency_overrides[get_config] = get_test_config
     app.dependency_overrides[get_current_user] = MockAdminUser
+    app.dependency_overrides[get_current_user_async] = MockAdminUser
+    app.dependency_overrides[get_optional_user] = MockAdminUser
 
     with TestClient(app) as client:
         yield client
@@ -0,0 +1,62 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from api.db import Base
+from api.models import Tag
+from api.utils.slow_query import SlowQueryLog
+
+
+class TestAdmin:
+    def test_get_db_pool_status(
+        self, admin_client: TestClient, general_client: TestClient, api_path: str
+    ):
+        response = general_client.get(f"{api_path}/admin/db/pool")
+        assert response.status_code == 400, response.text
+        response = admin_client.get(f"{api_path}/admin/db/pool")
+        assert response.status_code == 200, response.text
+        response_json = response.json()
+        assert response_json["sync"]["size"] == 5, response_json
+        assert "+Inf" in response_json["sync"]["wait"]["histogram_ms"], response_json
+        response = admin_client.delete(f"{api_path}/admin/db/pool")
+        assert response.status_code == 200, response.text
+
+    def test_get_slow_queries(self, admin_client: TestClient, api_path: str):
+        response = admin_client.get(f"{api_path}/admin/db/slow-queries")
+        assert response.status_code == 200, response.text
+        assert response.json()["queries"] == [], response.text
+        response = admin_client.delete(f"{api_path}/admin/db/slow-queries")
+        assert response.status_code == 200, response.text
+
+
+class TestSlowQueryLog:
+    def test_record_with_explain(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        slow_query_log = SlowQueryLog(threshold_ms=0, maxlen=2)
+        slow_query_log.instrument(engine)
+        with sessionmaker(bind=engine)() as db:
+            db.add(Tag(name="tag"))
+            db.commit()
+            db.scalars(select(Tag).filter(Tag.name == "tag")).all()
+        entries = slow_query_log.entries()
+        assert len(entries) == 2, entries
+        assert entries[0]["statement"].startswith("SELECT"), entries
+        assert entries[0]["parameters"] == ["'tag'"], entries
+        assert entries[0]["explain"], entries
+        assert entries[1]["explain"] is None, entries
+
+    def test_failed_statement(self):
+        engine = create_engine("sqlite:///:memory:")
+        slow_query_log = SlowQueryLog(threshold_ms=0)
+        slow_query_log.instrument(engine)
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            conn.execute(text("SELECT 1"))
+            # 失敗した文の開始時刻を接続に残さない
+            assert not any("start" in str(key) for key in conn.info)
+        entries = slow_query_log.entries()
+        assert [entry["statement"] for entry in entries] == ["SELECT 1"], entries
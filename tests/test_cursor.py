@@ -0,0 +1,24 @@
+import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from api.utils.cursor import decode_cursor, encode_cursor
+
+
+class TestCursor:
+    def test_round_trip(self):
+        value = datetime.datetime(2024, 1, 11, 10, 0)
+        cursor = encode_cursor("recent", value, 3)
+        assert decode_cursor(cursor, "recent") == (value, 3)
+
+    def test_sort_mismatch(self):
+        cursor = encode_cursor("pv", 10, 3)
+        with pytest.raises(HTTPException) as e:
+            decode_cursor(cursor, "review")
+        assert e.value.status_code == 400
+
+    def test_invalid(self):
+        with pytest.raises(HTTPException) as e:
+            decode_cursor("not-a-cursor", "id")
+        assert e.value.status_code == 400
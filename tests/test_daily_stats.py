@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.cruds.job as job_crud
+from api.db import db_config
+from api.models import Job, JobBookmark, JobDailyStat, JobViewLog, User
+from api.utils import get_jst_now
+
+
+class TestDailyStats:
+    @pytest.fixture
+    def rollup(self, monkeypatch):
+        monkeypatch.setattr(db_config, "IMPRESSION_ROLLUP_SECONDS", 60)
+
+    async def watch(self, async_db, job_id: int, user_id: int):
+        async for db in async_db():
+            await job_crud.record_watch_async(db, job_id, user_id)
+
+    def test_rollup(self, db_session, async_db, rollup):
+        user = db_session.query(User).first()
+        job = Job(name="求人")
+        db_session.add(job)
+        db_session.commit()
+        today = get_jst_now().date()
+        three_days_ago = today - datetime.timedelta(days=3)
+        for _ in range(2):
+            asyncio.run(self.watch(async_db, job.id, user.id))
+        db_session.add_all(
+            [
+                JobViewLog(
+                    job_id=job.id,
+                    user_id=user.id,
+                    count=2,
+                    created_at=get_jst_now() - datetime.timedelta(days=3),
+                ),
+                JobBookmark(user_id=user.id, job_id=job.id),
+            ]
+        )
+        db_session.commit()
+
+        assert job_crud.rollup_job_daily_stats(db_session) == 2
+        # 集計が確定した日の記録は削除する
+        assert db_session.query(JobViewLog).filter_by(job_id=job.id).count() == 2
+        days = job_crud.get_job_daily_impressions(
+            db_session, job.id, today - datetime.timedelta(days=4), today
+        )
+        assert [day["day"] for day in days][0] == today - datetime.timedelta(days=4)
+        by_day = {day.pop("day"): day for day in days}
+        assert len(by_day) == 5
+        assert by_day[today] == {
+            "views": 2,
+            "unique_viewers": 1,
+            "bookmarks": 1,
+            "applications": 0,
+        }
+        assert by_day[three_days_ago]["views"] == 2
+        assert by_day[today - datetime.timedelta(days=1)]["views"] == 0
+
+        # 再度集計しても、確定した日の集計は残る
+        job_crud.rollup_job_daily_stats(db_session)
+        assert (
+            db_session.query(JobDailyStat)
+            .filter_by(job_id=job.id, day=three_days_ago)
+            .one()
+            .views
+            == 2
+        )
+
+    def test_late_log(self, db_session, rollup):
+        user = db_session.query(User).first()
+        job = Job(name="求人")
+        db_session.add(job)
+        db_session.commit()
+        three_days_ago = get_jst_now() - datetime.timedelta(days=3)
+        two_days_ago = get_jst_now() - datetime.timedelta(days=2)
+        db_session.add_all(
+            [
+                JobViewLog(
+                    job_id=job.id, user_id=user.id, count=2, created_at=three_days_ago
+                ),
+                JobViewLog(
+                    job_id=job.id, user_id=user.id, count=1, created_at=two_days_ago
+                ),
+            ]
+        )
+        db_session.commit()
+        job_crud.rollup_job_daily_stats(db_session)
+
+        # 確定した後に届いた記録は、確定した集計に加算し、他の日の集計は残す
+        db_session.add(
+            JobViewLog(
+                job_id=job.id, user_id=user.id, count=1, created_at=three_days_ago
+            )
+        )
+        db_session.commit()
+        job_crud.rollup_job_daily_stats(db_session)
+        stats = {
+            stat.day: (stat.views, stat.unique_viewers, stat.finalized)
+            for stat in db_session.query(JobDailyStat).filter_by(job_id=job.id)
+        }
+        assert stats == {
+            three_days_ago.date(): (3, 1, True),
+            two_days_ago.date(): (1, 1, True),
+        }
+        assert db_session.query(JobViewLog).filter_by(job_id=job.id).count() == 0
+
+    def test_daily_impressions(self, company_client: TestClient, api_path: str):
+        response = company_client.get(
+            f"{api_path}/jobs/1/impressions/daily",
+            params={"from": "2024-01-01", "to": "2024-01-07"},
+        )
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 7
+        response = company_client.get(
+            f"{api_path}/jobs/1/impressions/daily",
+            params={"from": "2024-01-07", "to": "2024-01-01"},
+        )
+        assert response.status_code == 400, response.text
@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import api.cruds.dashboard as dashboard_crud
+from api.db import viewer_sketches
+from api.models import Application, Event, Job, JobViewSketch, User
+from api.utils import get_jst_now
+from api.utils.hll import HyperLogLog
+
+
+def count_queries(db_session, fn):
+    queries = []
+
+    def count(*args):
+        queries.append(1)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "after_cursor_execute", count)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "after_cursor_execute", count)
+    return result, len(queries)
+
+
+class TestDashboard:
+    def test_company_dashboard(self, db_session, monkeypatch):
+        monkeypatch.setattr(viewer_sketches, "interval", 60)
+        company = User(username="company", email="company@example.com", user_type="c")
+        db_session.add(company)
+        db_session.commit()
+        job = Job(
+            name="求人",
+            user_id=company.id,
+            view_count=10,
+            bookmark_count=2,
+            review_count=2,
+            review_sum=7,
+        )
+        db_session.add_all([job, Event(name="イベント", user_id=company.id)])
+        db_session.commit()
+        db_session.add_all(
+            [
+                Application(user_id=1, job_id=job.id, status="p"),
+                Application(user_id=company.id, job_id=job.id, status="a"),
+            ]
+        )
+        sketch = HyperLogLog()
+        sketch.add(1)
+        sketch.add(2)
+        old_sketch = HyperLogLog()
+        old_sketch.add(3)
+        today = get_jst_now().date()
+        db_session.add_all(
+            [
+                JobViewSketch(job_id=job.id, day=today, registers=sketch.to_bytes()),
+                # 期間外の HyperLogLog は読み込まない
+                JobViewSketch(
+                    job_id=job.id,
+                    day=today - timedelta(days=30),
+                    registers=old_sketch.to_bytes(),
+                ),
+            ]
+        )
+        db_session.commit()
+
+        dashboard, queries = count_queries(
+            db_session,
+            lambda: dashboard_crud.get_company_dashboard(db_session, company.id),
+        )
+        posting = dashboard["jobs"]["postings"][0]
+        assert posting["views"] == 10
+        assert posting["unique_viewers"] == 2
+        # 期間内の HyperLogLog がない投稿は、閲覧したユーザー数を推定しない
+        assert dashboard["events"]["postings"][0]["unique_viewers"] is None
+        assert posting["average_review_point"] == 3.5
+        assert posting["applications"] == {"p": 1, "a": 1}
+        assert dashboard["jobs"]["total"]["bookmarks"] == 2
+        assert dashboard["events"]["total"]["average_review_point"] is None
+        assert len(dashboard["events"]["postings"]) == 1
+
+        # 投稿が増えてもクエリの回数は変わらない
+        db_session.add_all([Job(name=f"求人{i}", user_id=company.id) for i in range(5)])
+        db_session.commit()
+        dashboard, more_queries = count_queries(
+            db_session,
+            lambda: dashboard_crud.get_company_dashboard(db_session, company.id),
+        )
+        assert len(dashboard["jobs"]["postings"]) == 6
+        assert more_queries == queries
+
+        # HyperLogLog を記録していない場合は、閲覧したユーザー数を返さない
+        monkeypatch.setattr(viewer_sketches, "interval", None)
+        dashboard = dashboard_crud.get_company_dashboard(db_session, company.id)
+        assert dashboard["jobs"]["postings"][0]["unique_viewers"] is None
+        assert dashboard["jobs"]["total"]["unique_viewers"] is None
+
+    def test_dashboard_route(self, company_client: TestClient, api_path: str):
+        response = company_client.get(f"{api_path}/users/dashboard")
+        assert response.status_code == 200, response.text
+        assert set(response.json()) == {"jobs", "events"}
+        response = company_client.get(
+            f"{api_path}/users/dashboard", params={"days": 367}
+        )
+        assert response.status_code == 422, response.text
@@ -0,0 +1,80 @@
+import datetime
+
+import api.cruds.job as job_crud
+import api.cruds.watch as watch_crud
+from api.models import Job, JobViewSketch
+from api.utils import get_jst_now
+from api.utils.hll import HyperLogLog, SketchBuffer
+
+
+class TestHyperLogLog:
+    def test_count(self):
+        assert HyperLogLog().count() == 0
+        for n in (1, 100, 10000):
+            sketch = HyperLogLog()
+            for i in range(n):
+                sketch.add(i)
+                sketch.add(i)
+            assert abs(sketch.count() - n) <= n * 0.05
+
+    def test_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(5000):
+            first.add(i)
+            second.add(i + 2500)
+        merged = HyperLogLog.from_bytes(first.to_bytes())
+        merged.merge(second)
+        assert abs(merged.count() - 7500) <= 7500 * 0.05
+        assert len(merged.to_bytes()) == 2048
+
+    def test_buffer(self):
+        buffer = SketchBuffer(1.0)
+        buffer.add("key", 1)
+        buffer.add("key", 2)
+        sketches = buffer.drain()
+        assert sketches["key"].count() == 2
+        buffer.add("key", 3)
+        buffer.restore(sketches)
+        assert buffer.drain()["key"].count() == 3
+
+
+class TestViewSketches:
+    def test_merge_and_estimate(self, db_session):
+        job = Job(name="求人")
+        db_session.add(job)
+        db_session.commit()
+        today = get_jst_now().date()
+        yesterday = today - datetime.timedelta(days=1)
+
+        for users in (range(0, 100), range(50, 150)):
+            sketch = HyperLogLog()
+            for user_id in users:
+                sketch.add(user_id)
+            job_crud.merge_job_view_sketches(
+                db_session, {(job.id, today): sketch, (job.id + 1, today): sketch}
+            )
+            db_session.commit()
+        sketch = HyperLogLog()
+        sketch.add(0)
+        job_crud.merge_job_view_sketches(db_session, {(job.id, yesterday): sketch})
+        db_session.commit()
+
+        # 存在しない求人のスケッチは書き込まない
+        assert db_session.query(JobViewSketch).filter_by(job_id=job.id + 1).count() == 0
+        estimate = watch_crud.estimate_viewers(
+            db_session, JobViewSketch, "job_id", [job.id]
+        )
+        assert abs(estimate - 150) <= 150 * 0.05
+        assert (
+            watch_crud.estimate_viewers(
+                db_session, JobViewSketch, "job_id", [job.id], date_to=yesterday
+            )
+            == 1
+        )
+        # HyperLogLog がない場合は、閲覧したユーザー数を 0 とせず None を返す
+        assert (
+            watch_crud.estimate_viewers(
+                db_session, JobViewSketch, "job_id", [job.id + 1]
+            )
+            is None
+        )
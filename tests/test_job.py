@@ -1,5 +1,14 @@
+import datetime
+
 from fastapi.testclient import TestClient
 
+import api.cruds.job as job_crud
+import api.cruds.user as user_crud
+from api.cruds.watch import AGE_RANGES
+from api.dependencies import get_current_user_async, get_optional_user, get_test_config
+from api.models import Job, JobTime
+from api.utils import MAX_SLOT_DURATION, get_jst_now
+
 CREATE_JOB = {
     "name": "テスト求人",
     "salary": "時給1000円",
@@ -45,11 +54,56 @@ class TestJob:
         assert len(response.json()) == 1
         assert response.json()[0]["name"] == "テスト求人"
 
+    def test_get_jobs_cursor(self, general_client: TestClient, api_path: str):
+        response = general_client.get(
+            f"{api_path}/jobs/", params={"sort": "pv", "limit": 1}
+        )
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 1
+        cursor = response.headers["X-Next-Cursor"]
+        response = general_client.get(
+            f"{api_path}/jobs/", params={"sort": "pv", "limit": 1, "cursor": cursor}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json() == []
+        assert "X-Next-Cursor" not in response.headers
+        response = general_client.get(
+            f"{api_path}/jobs/", params={"sort": "id", "cursor": cursor}
+        )
+        assert response.status_code == 400, response.text
+
+    def test_search_jobs(self, general_client: TestClient, api_path: str):
+        for keyword, count in [
+            ("香美", 1),
+            ("タグ", 1),
+            ("求", 1),
+            ("ﾃｽﾄ", 1),
+            ("てすと", 1),
+            ("高松", 0),
+        ]:
+            response = general_client.get(
+                f"{api_path}/jobs/", params={"keyword": keyword, "sort": "relevance"}
+            )
+            assert response.status_code == 200, response.text
+            assert len(response.json()) == count, keyword
+        response = general_client.get(f"{api_path}/jobs/", params={"tag": "たぐ"})
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 1
+
     def test_get_job(self, admin_client: TestClient, api_path: str):
         response = admin_client.get(f"{api_path}/jobs/1")
         assert response.status_code == 200, response.text
         assert response.json()["name"] == "テスト求人"
 
+    def test_get_job_without_lazy_load(
+        self, admin_client: TestClient, api_path: str, lazy_loads
+    ):
+        response = admin_client.get(f"{api_path}/jobs/")
+        assert response.status_code == 200, response.text
+        response = admin_client.get(f"{api_path}/jobs/1")
+        assert response.status_code == 200, response.text
+        assert list(lazy_loads) == []
+
     def test_update_job(self, admin_client: TestClient, api_path: str):
         response = admin_client.put(
             f"{api_path}/jobs/1",
@@ -157,6 +211,44 @@ class TestJob:
                 assert response.status_code == 200, response.text
                 assert response.json() is True
 
+    def test_is_favorite_in_list(self, admin_client: TestClient, api_path: str):
+        response = admin_client.get(f"{api_path}/jobs/", params={"limit": 4})
+        assert response.status_code == 200, response.text
+        # 奇数の id の求人をお気に入り登録している
+        for job in response.json():
+            assert job["is_favorite"] is (job["id"] % 2 == 1)
+
+    def test_optional_user_token(self, admin_client: TestClient, api_path: str):
+        overrides = admin_client.app.dependency_overrides
+        overrides.pop(get_optional_user)
+        overrides.pop(get_current_user_async)
+        token = user_crud.create_access_token(
+            get_test_config().SECRET_KEY, {"sub": "admin"}
+        )
+        response = admin_client.get(
+            f"{api_path}/jobs/",
+            params={"limit": 4},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        for job in response.json():
+            assert job["is_favorite"] is (job["id"] % 2 == 1)
+        # 不正なトークンはログインしていない場合と同じに扱う
+        response = admin_client.get(
+            f"{api_path}/jobs/",
+            params={"limit": 4},
+            headers={"Authorization": "Bearer invalid"},
+        )
+        assert response.status_code == 200, response.text
+        assert {job["is_favorite"] for job in response.json()} == {None}
+
+    def test_sort_by_favorite(self, general_client: TestClient, api_path: str):
+        response = general_client.get(
+            f"{api_path}/jobs/", params={"sort": "favorite", "limit": 15}
+        )
+        assert response.status_code == 200, response.text
+        assert [job["id"] for job in response.json()] == list(range(29, 0, -2))
+
     def test_get_all_favorite_jobs(self, general_client: TestClient, api_path: str):
         response = general_client.get(
             f"{api_path}/jobs/", params={"user_id": 1, "target": "favorite"}
@@ -178,6 +270,23 @@ class TestJob:
         assert response.status_code == 200, response.text
         assert len(response.json()) == 6
 
+    def test_get_job_impressions(self, admin_client: TestClient, api_path: str):
+        response = admin_client.get(
+            f"{api_path}/jobs/", params={"user_id": 1, "target": "history"}
+        )
+        job_id = response.json()[0]["id"]
+        response = admin_client.get(f"{api_path}/jobs/{job_id}/impressions")
+        assert response.status_code == 200, response.text
+        impressions = response.json()
+        assert impressions["pv"] == 1
+        # 管理者ユーザーは性別が o で、2000年生まれ
+        age = get_jst_now().year - 2000
+        label = next((label for label, upper in AGE_RANGES if age < upper), "over_40")
+        assert impressions["sex"]["o"][label] == 1
+        assert sum(sum(ages.values()) for ages in impressions["sex"].values()) == 1
+        # HyperLogLog を記録していない場合は、閲覧したユーザー数を返さない
+        assert impressions["unique_viewers"] is None
+
     def test_get_job_history_with_status(self, admin_client: TestClient, api_path: str):
         response = admin_client.get(
             f"{api_path}/jobs/",
@@ -236,3 +345,101 @@ class TestJob:
         assert response.status_code == 200, response.text
         response = admin_client.get(f"{api_path}/jobs/1")
         assert response.json() != {}, response.json()
+
+
+class TestNextStartTime:
+    def test_recent_jobs(self, admin_client: TestClient, api_path: str):
+        data = CREATE_JOB.copy()
+        tomorrow = get_jst_now() + datetime.timedelta(days=1)
+        data["job_times"] = [
+            {
+                "start_time": f"{tomorrow:%Y-%m-%d} {hour}:00:00",
+                "end_time": f"{tomorrow:%Y-%m-%d} {hour}:30:00",
+            }
+            for hour in [15, 12, 18]
+        ]
+        response = admin_client.post(f"{api_path}/jobs/", json=data)
+        assert response.status_code == 200, response.text
+        response = admin_client.get(f"{api_path}/jobs/", params={"sort": "recent"})
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 1
+        assert response.json()[0]["next_start_time"].endswith("12:00:00")
+
+    def test_time_range(self, general_client: TestClient, api_path: str):
+        tomorrow = get_jst_now() + datetime.timedelta(days=1)
+        for start, end, count in [("11:00", "12:10", 1), ("18:30", "23:00", 0)]:
+            response = general_client.get(
+                f"{api_path}/jobs/",
+                params={
+                    "from": f"{tomorrow:%Y-%m-%d}T{start}:00",
+                    "to": f"{tomorrow:%Y-%m-%d}T{end}:00",
+                },
+            )
+            assert response.status_code == 200, response.text
+            assert len(response.json()) == count, (start, end)
+
+    def test_calendar(self, general_client: TestClient, api_path: str):
+        tomorrow = get_jst_now() + datetime.timedelta(days=1)
+        response = general_client.get(
+            f"{api_path}/jobs/calendar/",
+            params={"year": tomorrow.year, "month": tomorrow.month},
+        )
+        assert response.status_code == 200, response.text
+        counts = {day["day"]: day["count"] for day in response.json()}
+        assert counts.pop(f"{tomorrow:%Y-%m-%d}") == 1
+        assert set(counts.values()) == {0}
+        for year in (0, 9999, 10000):
+            response = general_client.get(
+                f"{api_path}/jobs/calendar/", params={"year": year, "month": 12}
+            )
+            assert response.status_code == 422, response.text
+
+    def test_sweep(self, db_session):
+        now = get_jst_now()
+        job = Job(
+            name="求人",
+            next_start_time=now - datetime.timedelta(hours=1),
+            job_times=[
+                JobTime(start_time=now - datetime.timedelta(hours=1)),
+                JobTime(start_time=now + datetime.timedelta(hours=1)),
+            ],
+        )
+        db_session.add(job)
+        db_session.commit()
+        assert job_crud.sweep_next_start_times(db_session) == 1
+        db_session.refresh(job)
+        assert job.next_start_time == now + datetime.timedelta(hours=1)
+
+    def test_slot_duration(self, admin_client: TestClient, api_path: str):
+        # 2100-02-01 00:30 に終わる、上限の長さの日時
+        start = datetime.datetime(2100, 1, 1, 0, 30)
+        end = start + MAX_SLOT_DURATION
+        data = CREATE_JOB.copy()
+        for slot_end, status_code in [
+            (end + datetime.timedelta(minutes=1), 422),
+            (end, 200),
+        ]:
+            data["job_times"] = [
+                {
+                    "start_time": f"{start:%Y-%m-%d %H:%M:%S}",
+                    "end_time": f"{slot_end:%Y-%m-%d %H:%M:%S}",
+                }
+            ]
+            response = admin_client.post(f"{api_path}/jobs/", json=data)
+            assert response.status_code == status_code, response.text
+        # 上限の長さの日時は、終了直前の期間でも開始日時の下限に含まれる
+        for time_from, count in [(end - datetime.timedelta(hours=1), 1), (end, 0)]:
+            response = admin_client.get(
+                f"{api_path}/jobs/",
+                params={
+                    "from": f"{time_from:%Y-%m-%dT%H:%M:%S}",
+                    "to": f"{end:%Y-%m-%dT%H:%M:%S}",
+                },
+            )
+            assert response.status_code == 200, response.text
+            assert len(response.json()) == count, time_from
+        response = admin_client.get(
+            f"{api_path}/jobs/calendar/", params={"year": end.year, "month": end.month}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()[0]["count"] == 1
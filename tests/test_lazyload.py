@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from api.db import Base
+from api.models import Job, Tag
+from api.utils.lazyload import LazyLoadError, lazy_load_detector
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(Job(name="job", tags=[Tag(name="tag")]))
+        db.commit()
+        db.expunge_all()
+        yield db
+
+
+@pytest.fixture
+def raise_mode():
+    lazy_load_detector.enable("raise")
+    yield
+    lazy_load_detector.enable("warn")
+
+
+class TestLazyLoadDetector:
+    def test_record(self, db, lazy_loads):
+        job = db.scalars(select(Job)).first()
+        assert job.tags[0].name == "tag"
+        assert list(lazy_loads) == [{"relationship": "Job.tags", "route": None}]
+
+    def test_eager_load(self, db, lazy_loads):
+        job = db.scalars(select(Job).options(selectinload(Job.tags))).first()
+        assert job.tags[0].name == "tag"
+        assert list(lazy_loads) == []
+
+    def test_raise(self, db, raise_mode):
+        job = db.scalars(select(Job)).first()
+        with pytest.raises(LazyLoadError):
+            job.tags
@@ -0,0 +1,113 @@
+import datetime
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+import api.cruds.job as job_crud
+from api import main
+from api.db import db_config, listing_cache
+from api.models import Job, JobTime
+from api.utils import get_jst_now
+from api.utils.cache import ResultCache
+from tests.test_job import CREATE_JOB
+
+
+@pytest.fixture
+def cache_enabled(monkeypatch):
+    monkeypatch.setattr(listing_cache, "ttl", 60)
+    listing_cache.clear()
+    yield listing_cache
+    listing_cache.clear()
+
+
+class TestResultCache:
+    def test_ttl_and_lru(self):
+        cache = ResultCache(ttl=0.05, maxsize=2)
+        for key in ["a", "b", "c"]:
+            cache.set(key, key, tags=[], stamp=cache.stamp())
+        assert cache.get("a") is None
+        assert cache.get("c") == "c"
+        time.sleep(0.05)
+        assert cache.get("c") is None
+
+    def test_invalidate(self):
+        cache = ResultCache(ttl=60)
+        cache.set("a", "a", tags=["jobs"], stamp=cache.stamp())
+        cache.set("b", "b", tags=["events"], stamp=cache.stamp())
+        cache.invalidate(["jobs"])
+        assert cache.get("a") is None
+        assert cache.get("b") == "b"
+
+    def test_skip_stale_result(self):
+        cache = ResultCache(ttl=60)
+        stamp = cache.stamp()
+        cache.invalidate(["jobs"])
+        cache.set("a", "a", tags=["jobs"], stamp=stamp)
+        assert cache.get("a") is None
+
+    def test_disabled(self):
+        cache = ResultCache(ttl=None)
+        cache.set("a", "a", tags=[], stamp=cache.stamp())
+        assert cache.get("a") is None
+
+
+class TestListingCache:
+    def test_invalidate_on_write(
+        self, admin_client: TestClient, db_session, api_path: str, cache_enabled
+    ):
+        response = admin_client.get(f"{api_path}/jobs/")
+        assert response.status_code == 200, response.text
+        assert response.json() == []
+        # セッションの書き込みを経由しない行は、無効化されるまでキャッシュに反映されない
+        values = {k: v for k, v in CREATE_JOB.items() if k not in ["tags", "job_times"]}
+        db_session.execute(insert(Job).values(**values))
+        db_session.commit()
+        response = admin_client.get(f"{api_path}/jobs/")
+        assert response.json() == []
+        response = admin_client.put(
+            f"{api_path}/jobs/1/change-status", params={"status": "active"}
+        )
+        assert response.status_code == 200, response.text
+        response = admin_client.get(f"{api_path}/jobs/")
+        assert len(response.json()) == 1
+
+    def test_invalidate_on_sweep(self, db_session, cache_enabled, monkeypatch):
+        now = get_jst_now()
+        db_session.add(
+            Job(
+                name="求人",
+                next_start_time=now - datetime.timedelta(hours=1),
+                job_times=[JobTime(start_time=now + datetime.timedelta(hours=1))],
+            )
+        )
+        db_session.commit()
+        stamp = cache_enabled.stamp()
+        cache_enabled.set("recent", [], ["jobs", "jobs:sort:recent"], stamp)
+        cache_enabled.set("pv", [], ["jobs", "jobs:sort:pv"], stamp)
+        cache_enabled.set("events", [], ["events", "events:sort:pv"], stamp)
+        monkeypatch.setattr(main, "Session", sessionmaker(bind=db_session.get_bind()))
+        main.sweep_next_start_times()
+        # next_start_time はすべての一覧に含まれるため、日時を進めた側の一覧はすべて無効化する
+        assert cache_enabled.get("recent") is None
+        assert cache_enabled.get("pv") is None
+        assert cache_enabled.get("events") == []
+
+    def test_invalidate_on_compact(self, db_session, cache_enabled, monkeypatch):
+        monkeypatch.setattr(db_config, "VIEW_COUNTER_SHARDS", 4)
+        job = Job(name="求人")
+        db_session.add(job)
+        db_session.commit()
+        job_crud.compact_job_view_shards(db_session)
+        job_crud.add_job_views(db_session, job.id, 3)
+        db_session.commit()
+        stamp = cache_enabled.stamp()
+        cache_enabled.set("pv", [], ["jobs", "jobs:sort:pv"], stamp)
+        cache_enabled.set("recent", [], ["jobs", "jobs:sort:recent"], stamp)
+        monkeypatch.setattr(main, "Session", sessionmaker(bind=db_session.get_bind()))
+        main.compact_view_shards()
+        # 閲覧数を集約した一覧のキャッシュだけを無効化する
+        assert cache_enabled.get("pv") is None
+        assert cache_enabled.get("recent") == []
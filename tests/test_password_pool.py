@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import api.cruds.user as user_crud
+from api.utils.password import PasswordPool, PasswordPoolBusy
+
+
+class TestPasswordPool:
+    def test_hash_and_verify(self):
+        pool = PasswordPool(1, 1)
+        try:
+            hashed = pool.hash("password")
+            assert pool.verify("password", hashed)
+            assert not asyncio.run(pool.verify_async("wrong", hashed))
+        finally:
+            pool.shutdown()
+
+    def test_shed_when_full(self):
+        pool = PasswordPool(1, 1)
+        release = threading.Event()
+        try:
+            running = pool.submit(release.wait)
+            queued = pool.submit(release.wait)
+            with pytest.raises(PasswordPoolBusy):
+                pool.submit(release.wait)
+            release.set()
+            running.result()
+            queued.result()
+            # 完了した分だけ、再び受け付ける
+            assert pool.submit(lambda: True).result()
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_busy_returns_503(self, monkeypatch):
+        pool = PasswordPool(1, 0)
+        release = threading.Event()
+        monkeypatch.setattr(user_crud, "password_pool", pool)
+        try:
+            pool.submit(release.wait)
+            with pytest.raises(HTTPException) as e:
+                user_crud.hash_password("password")
+            assert e.value.status_code == 503
+            assert e.value.headers["Retry-After"]
+        finally:
+            release.set()
+            pool.shutdown()
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+import api.cruds.user as user_crud
+from api.db import principal_cache
+from api.dependencies import get_current_user, get_current_user_async, get_test_config
+from api.models import User
+
+
+@pytest.fixture
+def cache_enabled(monkeypatch):
+    monkeypatch.setattr(principal_cache, "ttl", 60)
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+class TestPrincipalCache:
+    def current_user(self, db_session, username: str):
+        settings = get_test_config()
+        token = user_crud.create_access_token(settings.SECRET_KEY, {"sub": username})
+        queries = []
+
+        def count(*args):
+            queries.append(1)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "after_cursor_execute", count)
+        try:
+            user = get_current_user(db_session, token, settings)
+        finally:
+            event.remove(engine, "after_cursor_execute", count)
+        return user, len(queries)
+
+    def test_cache(self, db_session, cache_enabled):
+        user, queries = self.current_user(db_session, "admin")
+        assert user.username == "admin"
+        assert queries == 1
+        # 別のセッションでも、キャッシュからクエリを発行せずに取得できる
+        db_session.expunge_all()
+        user, queries = self.current_user(db_session, "admin")
+        assert (user.id, user.user_type) == (1, "a")
+        assert queries == 0
+        assert user.job_bookmarks == []
+
+    def test_invalidate_on_update(self, db_session, cache_enabled):
+        self.current_user(db_session, "admin")
+        user = db_session.query(User).filter_by(username="admin").one()
+        user.is_active = False
+        db_session.commit()
+        user, queries = self.current_user(db_session, "admin")
+        assert queries == 1
+        assert user.is_active is False
+
+        # ユーザー名を変更した場合は、変更前のユーザー名のキャッシュも無効化する
+        user.username = "renamed"
+        db_session.commit()
+        assert self.current_user(db_session, "renamed")[0].id == 1
+        with pytest.raises(HTTPException):
+            self.current_user(db_session, "admin")
+        user.username = "admin"
+        user.is_active = True
+        db_session.commit()
+
+    def test_async(self, async_db, cache_enabled):
+        settings = get_test_config()
+
+        async def current_user(username: str):
+            token = user_crud.create_access_token(
+                settings.SECRET_KEY, {"sub": username}
+            )
+            async for db in async_db():
+                user = await get_current_user_async(db, token, settings)
+                return user.id, user.user_type
+
+        # 1回目はデータベースから、2回目はキャッシュから取得する
+        assert asyncio.run(current_user("admin")) == (1, "a")
+        assert asyncio.run(current_user("admin")) == (1, "a")
+        with pytest.raises(HTTPException):
+            asyncio.run(current_user("missing"))
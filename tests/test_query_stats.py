@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from api.db import db_config
+from api.dependencies import get_async_db, get_config, get_db, get_test_config
+from api.main import create_app
+from api.utils.query_stats import (
+    RequestQueryStats,
+    _current_stats,
+    instrument_engine,
+)
+
+
+@pytest.fixture
+def stats_client(db_session, async_db, monkeypatch):
+    monkeypatch.setattr(db_config, "DB_QUERY_STATS", True)
+    instrument_engine(db_session.get_bind())
+    app = create_app()
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_async_db] = async_db
+    app.dependency_overrides[get_config] = get_test_config
+
+    with TestClient(app) as client:
+        yield client
+
+
+class TestQueryStats:
+    def test_server_timing(self, stats_client: TestClient, api_path: str):
+        response = stats_client.get(f"{api_path}/tags/")
+        assert response.status_code == 200, response.text
+        assert response.headers["Server-Timing"].startswith('db;desc="1 queries"')
+
+    def test_no_query(self, stats_client: TestClient):
+        response = stats_client.get("/hello")
+        assert response.status_code == 200, response.text
+        assert response.headers["Server-Timing"].startswith('db;desc="0 queries"')
+
+    def test_async_route(self, stats_client: TestClient, api_path: str, caplog):
+        with caplog.at_level("INFO", logger="api.sql"):
+            response = stats_client.get(f"{api_path}/jobs/")
+        assert response.status_code == 200, response.text
+        assert '"route": "/api/v1/jobs/"' in caplog.text
+
+    def test_failed_statement(self):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        stats = RequestQueryStats({})
+        token = _current_stats.set(stats)
+        try:
+            with engine.connect() as conn:
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM missing"))
+                conn.execute(text("SELECT 1"))
+                # 失敗した文の開始時刻を接続に残さない
+                assert not any("start" in str(key) for key in conn.info)
+        finally:
+            _current_stats.reset(token)
+        assert stats.count == 1
+        assert stats.slowest_statement == "SELECT 1"
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from api.db import Base
+from api.models import Tag
+from api.utils.routing import RoutingSession, WriteTracker, set_principal
+
+
+@pytest.fixture
+def routing_factory(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine in [primary, replica]:
+        Base.metadata.create_all(bind=engine)
+    # レプリカにだけ存在する行で、どちらから読んだかを判別する
+    with sessionmaker(bind=replica)() as db:
+        db.add(Tag(name="replica"))
+        db.commit()
+
+    def factory(window: float = 60):
+        return sessionmaker(
+            class_=RoutingSession,
+            bind=primary,
+            replicas=[replica],
+            tracker=WriteTracker(window),
+        )
+
+    return factory
+
+
+def tag_names(db) -> list[str]:
+    return list(db.scalars(select(Tag.name)))
+
+
+class TestRoutingSession:
+    def test_read_from_replica(self, routing_factory):
+        with routing_factory()() as db:
+            assert tag_names(db) == ["replica"]
+
+    def test_write_to_primary_and_stick(self, routing_factory):
+        with routing_factory()() as db:
+            db.add(Tag(name="primary"))
+            db.commit()
+            assert tag_names(db) == ["primary"]
+
+    def test_read_your_writes(self, routing_factory):
+        Session = routing_factory()
+        with Session() as db:
+            set_principal(db, "username")
+            db.add(Tag(name="primary"))
+            db.commit()
+        with Session() as db:
+            set_principal(db, "username")
+            assert tag_names(db) == ["primary"]
+        with Session() as db:
+            set_principal(db, "other")
+            assert tag_names(db) == ["replica"]
+
+    def test_read_your_writes_window_expired(self, routing_factory):
+        Session = routing_factory(window=0)
+        with Session() as db:
+            set_principal(db, "username")
+            db.add(Tag(name="primary"))
+            db.commit()
+        with Session() as db:
+            set_principal(db, "username")
+            assert tag_names(db) == ["replica"]
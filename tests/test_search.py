@@ -0,0 +1,51 @@
+from sqlalchemy import delete, select, update
+
+import api.cruds.job as job_crud
+import api.cruds.search as search_crud
+from api.models import Job, JobSearchGram, Tag
+from api.utils.search import gram_weights, keyword_grams, ngrams, normalize
+
+
+class TestSearch:
+    def test_normalize(self):
+        assert (
+            normalize("ｶﾌｪ") == normalize("カフェ") == normalize("かふぇ") == "かふぇ"
+        )
+        assert normalize("ＲＥＥＬ Cafe") == "reel cafe"
+        assert normalize(None) == ""
+
+    def test_ngrams(self):
+        assert ngrams("高知 工科大") == ["高知", "知", "工科", "科大", "大"]
+        assert ngrams("ｶﾌｪ") == ["かふ", "ふぇ", "ぇ"]
+        assert ngrams(None) == []
+
+    def test_gram_weights(self):
+        weights = gram_weights([("高知", 10), ("高知県", 1)])
+        assert weights["高知"] == 11
+        assert weights["県"] == 1
+
+    def test_keyword_grams(self):
+        assert keyword_grams("高知県 市") == ["高知", "知県", "市"]
+        assert keyword_grams("  ") == []
+
+
+class TestReindex:
+    def test_reindex(self, db_session):
+        # 索引を追加する前に作成された求人・タグを再現する
+        tag = Tag(name="ｶﾌｪ")
+        job = Job(name="高知のカフェ", tags=[tag])
+        db_session.add(job)
+        db_session.commit()
+        job_id, tag_id = job.id, tag.id
+        db_session.execute(update(Tag).where(Tag.id == tag_id).values(name_key=None))
+        db_session.execute(delete(JobSearchGram).where(JobSearchGram.job_id == job_id))
+        db_session.commit()
+        scores = search_crud.search_scores(JobSearchGram, "job_id", "高知")
+        assert job_id not in db_session.scalars(select(scores.c.id)).all()
+
+        assert search_crud.backfill_tag_keys(db_session) >= 1
+        assert job_crud.reindex_jobs(db_session) >= 1
+        assert job_id in db_session.scalars(select(scores.c.id)).all()
+        assert db_session.get(Tag, tag_id).name_key == "かふぇ"
+        # 更新の必要がないタグは書き込まない
+        assert search_crud.backfill_tag_keys(db_session) == 0
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.routers.job as job_router
+from api.models import Job, User
+from api.routers.job import load_job_detail
+from api.utils.routing import WriteTracker
+from api.utils.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    def test_share_sync_call(self):
+        single_flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def load():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return len(calls)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            first = pool.submit(single_flight.do, "key", load)
+            started.wait()
+            others = [pool.submit(single_flight.do, "key", load) for _ in range(3)]
+            results = [first.result()] + [future.result() for future in others]
+        assert results == [1, 1, 1, 1]
+        assert single_flight.do("key", load) == 2
+
+    def test_share_async_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        async def main():
+            return await asyncio.gather(
+                *(single_flight.do_async("key", load) for _ in range(5))
+            )
+
+        assert asyncio.run(main()) == [1] * 5
+
+    def test_share_error(self):
+        single_flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise ValueError("error")
+
+        async def main():
+            return await asyncio.gather(
+                *(single_flight.do_async("key", load) for _ in range(2)),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(main())
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            asyncio.run(single_flight.do_async("key", load))
+
+    def test_leader_cancelled(self, db_session, async_session_factory):
+        single_flight = SingleFlight()
+        job = Job(
+            name="求人",
+            salary="1000円",
+            postal_code="782-8502",
+            prefecture="高知県",
+            city="香美市",
+            address="土佐山田町",
+            description="説明",
+            author=db_session.query(User).first(),
+        )
+        db_session.add(job)
+        db_session.commit()
+
+        def load():
+            return load_job_detail(async_session_factory, job.id)
+
+        async def main():
+            leader = asyncio.ensure_future(single_flight.do_async("key", load))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(single_flight.do_async("key", load))
+            # 最初のリクエストが切断されても、待っているリクエストは結果を受け取る
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(main()).name == "求人"
+
+    def test_key_by_primary(self, admin_client: TestClient, api_path: str, monkeypatch):
+        keys = []
+
+        class RecordingSingleFlight(SingleFlight):
+            async def do_async(self, key, fn):
+                keys.append(key)
+                return await super().do_async(key, fn)
+
+        write_tracker = WriteTracker(60)
+        monkeypatch.setattr(job_router, "single_flight", RecordingSingleFlight())
+        monkeypatch.setattr(job_router, "write_tracker", write_tracker)
+        response = admin_client.get(f"{api_path}/jobs/1")
+        assert response.status_code == 200, response.text
+        # 直前に書き込んだユーザーの読み込みは、レプリカからの読み込みと共有しない
+        write_tracker.mark("admin")
+        response = admin_client.get(f"{api_path}/jobs/1")
+        assert response.status_code == 200, response.text
+        assert keys == [("jobs", 1, "replica"), ("jobs", 1, "primary")]
@@ -0,0 +1,92 @@
+import datetime
+
+import pytest
+
+import api.cruds.job as job_crud
+from api.db import db_config
+from api.models import Job, JobViewShard, JobWatched, User
+from api.utils import get_jst_now
+from api.utils.view_buffer import ViewBuffer
+
+
+class TestViewBuffer:
+    def test_aggregate(self):
+        buffer = ViewBuffer(1.0)
+        now = get_jst_now()
+        later = now + datetime.timedelta(minutes=1)
+        buffer.add(("jobs", 1, 2), later)
+        buffer.add(("jobs", 1, 2), now)
+        buffer.add(("jobs", 1, 3), now)
+        assert len(buffer) == 2
+        views = buffer.drain()
+        assert views == {("jobs", 1, 2): (2, later), ("jobs", 1, 3): (1, now)}
+        assert len(buffer) == 0
+
+        buffer.add(("jobs", 1, 2), now)
+        buffer.restore(views)
+        assert buffer.drain()[("jobs", 1, 2)] == (3, later)
+
+    def test_disabled(self):
+        assert not ViewBuffer(None).enabled
+
+
+class TestFlushViews:
+    def test_flush_job_views(self, db_session):
+        user = db_session.query(User).first()
+        job = Job(name="求人")
+        db_session.add(job)
+        db_session.commit()
+        first = get_jst_now() - datetime.timedelta(hours=1)
+        last = first + datetime.timedelta(minutes=30)
+
+        job_crud.flush_job_views(db_session, {(user.id, job.id): (2, first)})
+        db_session.commit()
+        # 前回より古い閲覧で、最後に閲覧した日時が戻らないこと
+        job_crud.flush_job_views(
+            db_session,
+            {(user.id, job.id): (3, last), (user.id, job.id + 1): (1, last)},
+        )
+        job_crud.flush_job_views(db_session, {(user.id, job.id): (1, first)})
+        db_session.commit()
+
+        watched = (
+            db_session.query(JobWatched)
+            .filter(JobWatched.user_id == user.id, JobWatched.job_id == job.id)
+            .one()
+        )
+        db_session.refresh(watched)
+        db_session.refresh(job)
+        assert watched.count == 6
+        assert watched.updated_at == last
+        assert job.view_count == 6
+        # 存在しない求人への閲覧は書き込まない
+        assert db_session.query(JobWatched).filter_by(job_id=job.id + 1).count() == 0
+
+
+class TestViewShards:
+    @pytest.fixture
+    def shards(self, monkeypatch):
+        monkeypatch.setattr(db_config, "VIEW_COUNTER_SHARDS", 4)
+
+    def test_compact(self, db_session, shards):
+        job = Job(name="求人")
+        db_session.add(job)
+        db_session.commit()
+        # シャードの行がない場合は直接加算する
+        job_crud.add_job_views(db_session, job.id)
+        db_session.commit()
+        assert job_crud.compact_job_view_shards(db_session) == 0
+        assert db_session.query(JobViewShard).filter_by(job_id=job.id).count() == 4
+
+        for _ in range(10):
+            job_crud.add_job_views(db_session, job.id)
+        job_crud.add_job_views(db_session, job.id, 5)
+        db_session.commit()
+        db_session.refresh(job)
+        assert job.view_count == 1
+        assert job_crud.get_job_view_count(db_session, job.id) == 16
+
+        assert job_crud.compact_job_view_shards(db_session) == 1
+        db_session.refresh(job)
+        assert job.view_count == 16
+        assert job_crud.get_job_view_count(db_session, job.id) == 16